@@ -0,0 +1,171 @@
+# abilities.py
+# Character special abilities, keyed by character id. Each takes (gm, player_id, target_tile)
+# and returns a dict: {"name", "patches", "hits": [(player_id, health), ...], "effects": [(effect, rounds)]}
+# or {"error": reason}.
+# Nothing is applied here: the ability_request handler records the patches together with the
+# turn change, so an ability is one journal entry like any other action. Timed parts (buffs,
+# traps, the cooldown) go through gm.effects and expire on their own.
+import numpy as np
+import board, combat
+from classes.characters import CHARACTERS
+
+# rounds before a player can use their ability again
+COOLDOWN_ROUNDS = 3
+
+
+def _fight(gm):
+    return combat.CombatState.from_match(gm.state, CHARACTERS)
+
+
+def _tile(gm, player_id):
+    return board.POS_TILE.get(tuple(gm.state["players"][player_id]["position"]))
+
+
+def _hits(fight, mask):
+    return [(fight.player_ids[i], float(fight.health[i])) for i in np.flatnonzero(mask)]
+
+
+def _result(name, patches=(), hits=(), effects=()):
+    return {"name": name, "patches": list(patches), "hits": list(hits), "effects": list(effects)}
+
+
+def _move(gm, player_id, tile):
+    """Patches putting player_id on tile (then up its ladder or down its snake), springing an
+    opponent's trap where they end up. Returns (patches, hits)."""
+    tile = board.land(tile, gm.jumps)
+    pos = board.TILE_POS[tile]
+    patches = [(["players", player_id, "position"], [pos[0], pos[1]])]
+    more, hits = spring_trap(gm, player_id, tile)
+    return patches + more, hits
+
+
+def spring_trap(gm, player_id, tile):
+    """(patches, hits) for player_id stopping on tile: an opponent's trap there deals its damage once."""
+    trap = gm.effects.trap_at(tile, player_id)
+    if trap is None:
+        return [], []
+    fight = _fight(gm)
+    mask = fight.on_tile(-2)
+    mask[fight.index[player_id]] = True
+    fight.hit(mask, trap["amount"])
+    return fight.patches(mask) + gm.effects.spring_trap(tile), _hits(fight, mask)
+
+
+def _strike(gm, player_id, target_tile, name, multiplier=1.0, pierce=False):
+    """Single-target hit on target_tile, or on the weakest opponent in range when no tile is given."""
+    fight = _fight(gm)
+    me = fight.index[player_id]
+    hit = fight.in_range(me) & fight.alive()
+    if target_tile is not None:
+        hit &= fight.on_tile(target_tile)
+    candidates = np.flatnonzero(hit)
+    if not len(candidates):
+        return {"error": "no_target"}
+    victim = candidates[np.argmin(fight.health[candidates])]
+    hit[:] = False
+    hit[victim] = True
+    fight.attack_players(me, hit, multiplier, pierce)
+    return _result(name, fight.patches(hit), _hits(fight, hit))
+
+
+def healing_light(gm, player_id, target_tile):
+    info = gm.state["players"][player_id]
+    health = min(info["max_health"], info["health"] + 20)
+    return _result("Healing Light", [(["players", player_id, "health"], health)], [(player_id, health)])
+
+
+def power_strike(gm, player_id, target_tile):
+    return _strike(gm, player_id, target_tile, "Power Strike", multiplier=1.5)
+
+
+def set_trap(gm, player_id, target_tile):
+    tile = _tile(gm, player_id)
+    if tile is None:
+        return {"error": "in_spawn"}
+    trap = {"kind": "trap", "player": player_id, "tile": tile, "amount": CHARACTERS[3].attack * 2}
+    return _result("Trap", effects=[(trap, 3)])
+
+
+def quick_dash(gm, player_id, target_tile):
+    """Two tiles forward, hitting every opponent on the tiles passed or landed on."""
+    tile = _tile(gm, player_id)
+    if tile is None:
+        return {"error": "in_spawn"}
+    path = list(range(tile + 1, min(tile + 2, board.LAST_TILE) + 1))
+    if not path:
+        return {"error": "no_room"}
+    fight = _fight(gm)
+    me = fight.index[player_id]
+    hit = np.isin(fight.tiles, path) & fight.alive()
+    hit[me] = False
+    fight.attack_players(me, hit)
+    patches, hits = _move(gm, player_id, path[-1])
+    return _result("Quick Dash", fight.patches(hit) + patches, _hits(fight, hit) + hits)
+
+
+def fortify(gm, player_id, target_tile):
+    return _result("Fortify", effects=[({"kind": "shield", "player": player_id, "amount": 15}, 2)])
+
+
+def rage(gm, player_id, target_tile):
+    return _result("Rage", effects=[({"kind": "attack", "player": player_id, "amount": 5}, 3)])
+
+
+def teleport(gm, player_id, target_tile):
+    """Three tiles forward, over anyone in between."""
+    tile = _tile(gm, player_id)
+    if tile is None:
+        return {"error": "in_spawn"}
+    if tile == board.LAST_TILE:
+        return {"error": "no_room"}
+    patches, hits = _move(gm, player_id, min(tile + 3, board.LAST_TILE))
+    return _result("Teleport", patches, hits)
+
+
+def headshot(gm, player_id, target_tile):
+    return _strike(gm, player_id, target_tile, "Headshot", pierce=True)
+
+
+def bomb_attack(gm, player_id, target_tile):
+    """Bomb a tile in range, hitting everyone within one step of it. Without a tile, the tile
+    in range catching the most opponents is picked."""
+    fight = _fight(gm)
+    me = fight.index[player_id]
+    in_range = np.flatnonzero(fight.in_range(me) & fight.alive())
+    if target_tile is None:
+        if not len(in_range):
+            return {"error": "no_target"}
+        others = fight.alive() & (np.arange(len(fight.player_ids)) != me)
+        target_tile = max(set(fight.tiles[in_range].tolist()), key=lambda t: (fight.area(t, 1) & others).sum())
+    elif target_tile not in set(fight.tiles[in_range].tolist()):
+        return {"error": "no_target"}
+    hit = fight.bomb(me, target_tile)
+    return _result("Bomb Attack", fight.patches(hit), _hits(fight, hit))
+
+
+# character id -> ability
+ABILITIES = {
+    1: healing_light,
+    2: power_strike,
+    3: set_trap,
+    4: quick_dash,
+    5: fortify,
+    6: rage,
+    7: teleport,
+    8: headshot,
+    9: bomb_attack,
+}
+
+
+def use(gm, player_id, target_tile=None):
+    """Run player_id's ability; its timed effects and the cooldown are turned into patches here."""
+    if gm.effects.on_cooldown(player_id):
+        return {"error": "cooldown"}
+    ability = ABILITIES.get(gm.state["players"][player_id]["id"])
+    if ability is None:
+        return {"error": "no_ability"}
+    result = ability(gm, player_id, target_tile)
+    if "error" not in result:
+        effects = result.pop("effects") + [({"kind": "cooldown", "player": player_id}, COOLDOWN_ROUNDS)]
+        result["patches"] += gm.effects.add(effects)
+    return result
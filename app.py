@@ -9,19 +9,18 @@ from minigames import minigame_bp
 from dotenv import load_dotenv
 from datetime import datetime
 from flask_socketio import SocketIO, emit, join_room, leave_room
-import os, string, random, uuid, json_manager
+from sqlalchemy.exc import SQLAlchemyError
+import os, string, random, uuid, json_manager, functools, board, combat, abilities, bots, atexit, multiprocessing
+import numpy as np
 from collections import defaultdict
+from threading import Lock
+from concurrent.futures import ProcessPoolExecutor
 from shop import shop_bp
-from game_manager import GameManager
-from classes.dice import FortuneCore, RiskRoller, BlazeCube, FrostPrism, DoubleFortuneCore
-
-dices = {
-    1: FortuneCore(),
-    2: RiskRoller(),
-    3: BlazeCube(),
-    4: FrostPrism(),
-    5: DoubleFortuneCore()
-}
+from game_manager import GameManager, BitboardGameManager
+from match_lifecycle import MatchLifecycle, match_result, match_result_after
+from combat import CombatState
+from timers import TimerHeap
+from classes.dice import load_dice
 # Load environment variables from .env file
 load_dotenv()
 
@@ -39,6 +38,16 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-in-pr
 # Initialize database
 init_db(app)
 
+# dice_id -> classes.dice.WeightedDice, from the Dice table; read once, a new die is a new row
+with app.app_context():
+    try:
+        dices = load_dice(Dice.query.all())
+    except SQLAlchemyError:
+        # dice.outcomes not there yet: junk/migrate_add_dice_outcomes.py imports this module to add it
+        db.session.rollback()
+        app.logger.warning("could not load the dice table, using the built-in dice")
+        dices = load_dice([])
+
 app.register_blueprint(auth_bp)
 app.register_blueprint(minigame_bp)
 
@@ -48,15 +57,159 @@ DATA_DIR = os.path.join(os.getcwd(), "matches")
 os.makedirs(DATA_DIR, exist_ok=True)
 def match_path(match_id):
     return os.path.join(DATA_DIR, f"match_{match_id}.json")
-# In-memory active games: match_id -> GameManager
+# occupancy backend for new and rehydrated games: GAME_BACKEND=dict (default) or bitboard
+GameManagerClass = BitboardGameManager if os.getenv('GAME_BACKEND') == 'bitboard' else GameManager
+# In-memory active games: match_id -> GameManager (authoritative match state)
 active_games: dict = {}
+# guards inserts into active_games; each match's own state is guarded by gm.lock
+active_games_lock = Lock()
+# ids of matches that are still being played (matches/index.json), loaded lazily by get_game
+live_matches: set = json_manager.load_live_index(DATA_DIR)
+# finished/idle/abandoned match policy, see match_lifecycle.py
+lifecycle = MatchLifecycle(
+    idle_ttl=float(os.getenv('MATCH_IDLE_TTL', '1800')),
+    abandon_ttl=float(os.getenv('MATCH_ABANDON_TTL', str(7 * 24 * 3600))),
+    max_resident=int(os.getenv('MAX_ACTIVE_GAMES', '1000')),
+)
+for _match_id in live_matches:
+    lifecycle.touch(_match_id)
+# seconds between write-behind checkpoints of dirty matches
+CHECKPOINT_INTERVAL = float(os.getenv('CHECKPOINT_INTERVAL', '5'))
+# seconds a player has to finish their turn before the server passes it on (0 disables)
+TURN_TIMEOUT = float(os.getenv('TURN_TIMEOUT', '60'))
+# ladders and snakes: "off", "classic" (board.CLASSIC_LAYOUT) or "chaos" (new random layout every round)
+BOARD_FEATURES = os.getenv('BOARD_FEATURES', 'off')
+# every match's deadlines, served by the single run_timers background task
+timers = TimerHeap()
+# computer players: new matches are topped up with bots to BOT_FILL_TO players (0 disables)
+BOT_FILL_TO = int(os.getenv('BOT_FILL_TO', '0'))
+# seconds a bot waits before acting (so the room can follow) and may spend searching
+BOT_THINK_DELAY = float(os.getenv('BOT_THINK_DELAY', '1'))
+BOT_BUDGET = float(os.getenv('BOT_BUDGET', '0.5'))
+# bot searches run in worker processes, created on first use
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '2'))
+_bot_pool = None
+# seconds a disconnected player has to reconnect before the autopilot plays their turns
+RECONNECT_GRACE = float(os.getenv('RECONNECT_GRACE', '15'))
+# seconds the autopilot waits before playing a turn, so the room can follow
+AUTOPILOT_DELAY = float(os.getenv('AUTOPILOT_DELAY', '1'))
+# socket sid -> (match_id, player_id) it joined, and (match_id, player_id) -> its sids
+match_sids: dict = {}
+player_sids: dict = defaultdict(set)
+# (match_id, player_id) of disconnected players whose turns the autopilot plays
+autopilot: set = set()
+presence_lock = Lock()
+_background_started = False
 pending_friend_house_requests: dict[int, dict[int, dict]] = defaultdict(dict)
 
 def new_match_uuid():
     return str(uuid.uuid4())
 
 
+def match_locked(handler):
+    """Run a match socket handler under that match's lock.
+    Events for one match are applied one at a time (no lost updates between
+    e.g. attack_request and skip_turn), while different matches run in parallel."""
+    @functools.wraps(handler)
+    def wrapper(data):
+        while True:
+            gm = get_game((data or {}).get('match_id'))
+            if gm is None:
+                return handler(data)
+            with gm.lock:
+                # evicted while we waited for the lock: fetch the rehydrated instance instead
+                if gm.evicted:
+                    continue
+                return handler(data)
+    return wrapper
+
+
+def broadcast_record(gm, event, patches, **info):
+    """Record an action and send the room only what changed.
+
+    Clients apply match_delta on top of their last match_snapshot. version is the
+    journal seq, so a client that sees a gap asks for a full resync."""
+    entry = json_manager.record(gm, event, patches, **info)
+    socketio.emit('match_delta', {"match_id": gm.match_id, "version": entry["seq"], "set": entry["set"]}, room=f"match_{gm.match_id}")
+    return entry
+
+
+def end_turn(gm, event, patches=(), **info):
+    """Finish the current player's action and hand the turn on.
+
+    The action's patches and the turn change go into one journal entry, the only
+    write a turn makes; checkpoint_active_games folds the journal into a snapshot
+    later. Then the room gets turn_update for whoever moves next.
+    An action that decides the match records the result instead of a turn change,
+    and nobody gets another turn (see finish_match)."""
+    finished, winner_id = match_result_after(gm.state, patches)
+    if finished:
+        patches = list(patches) + [(["finished"], True), (["winner"], winner_id), (["pending_roll"], None)]
+        broadcast_record(gm, event, patches, **info)
+        json_manager.checkpoint(gm)
+        finish_match(gm, winner_id)
+        return None
+    turn, turn_patches = gm.turns.advance()
+    patches = list(patches) + turn_patches
+    turn_no = gm.state.get("turn_no", 0) + 1
+    if BOARD_FEATURES == "chaos" and turn_patches and turn_no % max(1, len(gm.state["turn_order"])) == 0:
+        # Chaos mode: the ladders and snakes move every round
+        patches.append((["board_features"], board.random_layout(gm.rng)))
+    broadcast_record(gm, event, patches, **info)
+    if turn is not None:
+        socketio.emit('turn_update', {"turn": turn, "user": gm.state["players"][turn]["user"]}, room=f"match_{gm.match_id}")
+    arm_turn_timer(gm, turn)
+    return turn
+
+
+def finish_match(gm, winner_id):
+    """The match is decided: stop its timers and tell the room. sweep_matches archives it."""
+    timers.cancel(("turn", gm.match_id))
+    timers.cancel(("bot", gm.match_id))
+    timers.cancel(("autopilot", gm.match_id))
+    winner = gm.state["players"][winner_id]["user"] if winner_id else None
+    socketio.emit('game_over', {"match_id": gm.match_id, "winner": winner_id, "user": winner}, room=f"match_{gm.match_id}")
+
+
+def board_features(gm):
+    """Ladders and snakes a match starts with, per BOARD_FEATURES."""
+    if BOARD_FEATURES == "classic":
+        return board.CLASSIC_LAYOUT
+    if BOARD_FEATURES == "chaos":
+        return board.random_layout(gm.rng)
+    return None
+
+
+def arm_turn_timer(gm, turn):
+    """Start turn's countdown, replacing the previous turn's deadline for this match."""
+    if TURN_TIMEOUT > 0 and turn is not None:
+        timers.schedule(("turn", gm.match_id), TURN_TIMEOUT, turn)
+    arm_auto_turn(gm, turn)
+
+
+def arm_auto_turn(gm, turn):
+    """If a bot or the autopilot plays turn, schedule it after a short delay (see play_bot_turn,
+    run_autopilot). Only while a human is connected to the match: once they've all left,
+    nobody plays the match out and the turn timer and abandon TTL take over."""
+    bot = auto = False
+    if turn is not None and humans_connected(gm):
+        bot = gm.state["players"][turn].get("bot", False)
+        auto = (gm.match_id, turn) in autopilot
+    for kind, on, delay in (("bot", bot, BOT_THINK_DELAY), ("autopilot", auto, AUTOPILOT_DELAY)):
+        if on:
+            timers.schedule((kind, gm.match_id), delay, turn)
+        else:
+            timers.cancel((kind, gm.match_id))
+
+
+def humans_connected(gm):
+    """Whether any human player of gm has a socket in the match."""
+    with presence_lock:
+        return any(player_sids.get((gm.match_id, pid)) for pid, info in gm.state["players"].items() if not info.get("bot"))
+
+
 @socketio.on('join_game')
+@match_locked
 def handle_join_game(data):
     """
     Client should send { match_id: int, player_id: str, char_type: optional }.
@@ -75,10 +228,10 @@ def handle_join_game(data):
     except (TypeError, ValueError):
         numeric_user_id = None
 
-    gm = active_games.get(match_id)
-
-    from classes.characters import Characters
-    char = Characters()
+    gm = get_game(match_id)
+    if gm is None:
+        emit('error', {'message': 'match_not_active'})
+        return
 
     player_record: Player | None = None
     if numeric_user_id is not None:
@@ -88,46 +241,62 @@ def handle_join_game(data):
     if player_record and player_record.equipped_character:
         equipped_character_id = player_record.equipped_character
 
-    db_char = Character.query.get(equipped_character_id)
-    if db_char:
-        char.name = db_char.name
-        char.character_id = db_char.id
-        char.image_path = db_char.image_path
-        char.type = db_char.character_type
-
-    path = match_path(match_id)
+    char = json_manager.characters.get(equipped_character_id, json_manager.characters[1])
+    track_connection(request.sid, match_id, player_id_str)
 
     try:
         pos = gm.spawn_player(player_id_str, char, (-1,-1))
     except:
-        data = json_manager.read_json(path)
+        data = gm.state
         turn_order = data["turn_order"]
+        turn = turn_order[data["current_turn_index"]]
         room = f"match_{match_id}"
         join_room(room)
-        socketio.emit('match_snapshot', data, room=room)
-        socketio.emit('turn_update', {"turn": turn_order[data["current_turn_index"]], "user": data["players"][turn_order[0]]["user"]}, room=room)
+        # nothing changed for the others in the room, only the rejoining client needs the full state
+        emit('match_snapshot', gm.encoded_state())
+        socketio.emit('turn_update', {"turn": turn, "user": data["players"][turn]["user"]}, room=room)
         socketio.emit('health_update', {"current_health": data["players"][raw_player_id]["health"], "max_health": data["players"][raw_player_id]["max_health"], "user_id": raw_player_id}, room=room)
         return
 
     print(f"Player {player_id_str} joined match {match_id} at position {pos}")
+    data = gm.state
+    turn_order = json_manager.gen_turn_order(data, gm.rng)
+    board_layout = json_manager.create_board(gm.rng)
+    json_manager.record(gm, "join", [
+        (["turn_order"], turn_order),
+        (["current_turn_index"], 0),
+        (["board_layout"], board_layout),
+        (["board_features"], board_features(gm)),
+        (["players", player_id_str, "position"], [pos[0], pos[1]]),
+    ], player=player_id_str)
     # persist snapshot to file
-    turn_order = json_manager.gen_turn_order(path)
-    board_layout = json_manager.create_board(path)
-    json_manager.add_pos(path, raw_player_id, pos)
+    json_manager.checkpoint(gm)
     
     # join socket room for match
     room = f"match_{match_id}"
     join_room(room)
-    data = json_manager.read_json(path)
     
-    socketio.emit('match_snapshot', data, room=room)
+    socketio.emit('match_snapshot', gm.encoded_state(), room=room)
     socketio.emit('turn_update', {"turn": turn_order[0], "user": data["players"][turn_order[0]]["user"]}, room=room)
+    arm_turn_timer(gm, turn_order[0])
     socketio.emit('health_update', {"current_health": data["players"][raw_player_id]["health"], "max_health":data["players"][raw_player_id]["max_health"]}, room=room)
 
+@socketio.on('resync_request')
+@match_locked
+def handle_resync_request(data):
+    """Client missed a match_delta (version gap): send it the full current state."""
+    gm = get_game(data.get('match_id'))
+    if gm is None:
+        emit('error', {'message': 'match_not_active'})
+        return
+    emit('match_snapshot', gm.encoded_state())
+
 @socketio.on('move_request')
+@match_locked
 def handle_move_request(data):
     """
     Client sends { match_id, player_id, target: [x,y], steps_allowed: optional }
+    steps_allowed is ignored: target is checked against the roll stored by roll_request.
     """
     match_id = data.get('match_id')
     player_id = data.get('player_id') or session.get('user_id')
@@ -136,34 +305,44 @@ def handle_move_request(data):
         emit('move_failed', {'reason': 'missing_params'})
         return
 
-    gm = active_games.get(match_id)
+    gm = get_game(match_id)
     if gm is None:
         emit('move_failed', {'reason': 'match_not_active'})
         return
 
-    target_pos = [target[0], target[1]]
-    path = match_path(match_id)
-    json_manager.add_pos(path, player_id, target_pos)
-    data = json_manager.read_json(path)
-
-    if data:
-        room = f"match_{match_id}"
-        total_players = data["player_count"]
-        next_turn_ind = data["current_turn_index"] + 1
-        turn_order = data["turn_order"]
-
-        if next_turn_ind > (total_players - 1):
-            next_turn_ind = 0
-
-        json_manager.modify_json(path, ["current_turn_index"], next_turn_ind)
-        socketio.emit('turn_update', {"turn":turn_order[next_turn_ind], "user": data["players"][turn_order[next_turn_ind]]["user"]}, room=room)
-
-        socketio.emit('match_snapshot', data, room=room)
-    else:    
-        emit('move_failed', {'reason': 'invalid_move'})
+    reason = move_player(gm, str(player_id), target)
+    if reason:
+        emit('move_failed', {'reason': reason})
+
+
+def move_player(gm, player_id, target):
+    """Move player_id to target ([x, y]) with their pending roll and end the turn.
+    Returns the reason the move was refused, None once it's done."""
+    data = gm.state
+    if player_id not in data["players"]:
+        return 'invalid_move'
+    pending = data.get("pending_roll")
+    if not pending or pending["player"] != player_id:
+        return 'no_roll'
+    # one table lookup: is target among the tiles this roll can reach from here
+    origin = board.origin_tile(data["players"][player_id]["position"])
+    tile = board.POS_TILE.get((target[0], target[1]), board.SPAWN)
+    if not board.can_move(origin, pending["value"], tile):
+        return 'invalid_move'
+
+    tile = board.land(tile, gm.jumps)
+    x, y = board.TILE_POS[tile]
+    patches = [(["players", player_id, "position"], [x, y])]
+    # stopping on an opponent's trap (Makdi) costs health
+    trap_patches, hits = abilities.spring_trap(gm, player_id, tile)
+    patches += trap_patches
+    emit_hits(gm, player_id, hits)
+    end_turn(gm, "move", patches, player=player_id)
+    return None
 
 
 @socketio.on('roll_request')
+@match_locked
 def handle_roll_request(data):
     """
     Client: { match_id, player_id }
@@ -175,70 +354,71 @@ def handle_roll_request(data):
         emit('roll_result', {'reason': 'missing_params'})
         return
 
-    gm = active_games.get(match_id)
+    gm = get_game(match_id)
     if gm is None:
         emit('roll_result', {'reason': 'match_not_active'})
         return
-    path = match_path(match_id)
-    data = json_manager.read_json(path)
+    result = roll_dice(gm, str(player_id))
+    if "reason" in result:
+        emit('roll_result', result)
+
+
+def roll_dice(gm, player_id):
+    """Roll player_id's dice for their turn and tell the room.
+    Returns the roll_result payload, or {"reason": ...} when they can't roll now."""
+    data = gm.state
+    if gm.turns.current() != player_id:
+        return {'reason': 'not_your_turn'}
+    if data.get("pending_roll"):
+        # one roll per turn; the pending one is spent by move_request or dropped at turn end
+        return {'reason': 'already_rolled'}
     dice_id = data["players"][player_id]["dice_id"]
     user = data["players"][player_id]["user"]
-    player_dice = dices[dice_id]
-
-    try:
-        value = player_dice.roll()
-    except Exception:
-        value = FortuneCore().roll()
-
-    room = f"match_{match_id}"
-    socketio.emit('roll_result', {"user": user, "value": value, "user_id": player_id}, room=room)
+    outcome = dices.get(dice_id, dices[1]).roll_outcome(gm.rng)
+    value, extra_turn = outcome["value"], outcome["extra_turn"]
+    # the roll is kept server-side so move_request can be checked against it;
+    # an extra turn is banked now and spent by the scheduler when this turn ends
+    patches = [(["pending_roll"], {"player": player_id, "value": value})]
+    if extra_turn:
+        patches += gm.turns.grant_extra_turn(player_id)
+    hits = []
+    if outcome["backfire"]:
+        # cursed dice hurt the roller, shield or not
+        fight = CombatState.from_match(data, json_manager.characters)
+        me = fight.index[player_id]
+        hit = fight.on_tile(-2)
+        hit[me] = True
+        fight.hit(hit, outcome["backfire"], pierce=True)
+        patches += fight.patches(hit)
+        hits = [(player_id, float(fight.health[me]))]
+
+    result = {"user": user, "value": value, "user_id": player_id, "extra_turn": extra_turn, "backfire": outcome["backfire"]}
+    socketio.emit('roll_result', result, room=f"match_{gm.match_id}")
+    emit_hits(gm, player_id, hits)
+    if hits and hits[0][1] <= 0:
+        # the backfire finished them: no move, the turn passes
+        end_turn(gm, "roll", patches, player=player_id, value=value)
+    else:
+        broadcast_record(gm, "roll", patches, player=player_id, value=value)
+    return result
 
 
 @socketio.on('attackable_players')
+@match_locked
 def find_attackable_players(data):
     match_id = data.get("match_id")
-    player_id = data.get("player_id")
-    path = match_path(match_id)
-    players_data = json_manager.read_json(path)["players"]
-    player_pos = players_data[player_id]["position"]
-
+    player_id = str(data.get("player_id") or session.get('user_id'))
+    gm = get_game(match_id)
+    if gm is None:
+        emit('attackable_players_result', {"match_id": match_id, "player_id": player_id, "attacks": [], "success": False, "reason": "match_not_active"})
+        return
+    reason = turn_error(gm, player_id, acting=True)
+    if reason:
+        emit('attackable_players_result', {"match_id": match_id, "player_id": player_id, "attacks": [], "success": False, "reason": reason})
+        return
+    players_data = gm.state["players"]
     player_char = json_manager.characters[players_data[player_id]["id"]]
-    char_range = player_char.range
-    attackable_blocks = []
-
-    for i in range(char_range[0], char_range[1] + 1):
-        pos_x = player_pos[0] + i
-        pos_y = player_pos[1] + i
-        neg_x = player_pos[0] - i
-        neg_y = player_pos[1] - i
-
-        if pos_x > 9:
-            pass
-        else:
-            attackable_blocks.append([pos_x, player_pos[1]])
-        if pos_y > 9:
-            pass
-        else:
-            attackable_blocks.append([player_pos[0], pos_y])
-        if neg_x < 0:
-            pass
-        else:
-            attackable_blocks.append([neg_x, player_pos[1]])
-        if neg_y < 0:
-            pass
-        else:
-            attackable_blocks.append([player_pos[0], neg_y])
-
-        if pos_x > 9 and pos_y > 9 and neg_x < 0 and neg_y < 0:
-            break
-
-    attackable_players = []
-
-    for player in players_data:
-        if player == player_id:
-            continue
-        if players_data[player]["position"] in attackable_blocks:
-            attackable_players.append(players_data[player]["position"])
+    attackable_players = [players_data[player]["position"] for player in gm.attackable(player_id, player_char.range)]
 
     success = False
     if attackable_players:
@@ -247,78 +427,399 @@ def find_attackable_players(data):
     socketio.emit("attackable_players_result", {"match_id": match_id, "player_id": player_id, "attacks": attackable_players, "success": success})
     
     if not success:
-        data = json_manager.read_json(path)
-        room = f"match_{match_id}"
-        total_players = data["player_count"]
-        next_turn_ind = data["current_turn_index"] + 1
-        turn_order = data["turn_order"]
-
-        if next_turn_ind > (total_players - 1):
-            next_turn_ind = 0
-
-        json_manager.modify_json(path, ["current_turn_index"], next_turn_ind)
-        socketio.emit('turn_update', {"turn":turn_order[next_turn_ind], "user": data["players"][turn_order[next_turn_ind]]["user"]}, room=room)
+        end_turn(gm, "turn")
 
 
 @socketio.on('attack_request')
+@match_locked
 def handle_attack_request(data):
     match_id = data.get("match_id")
-    player_id = data.get("player_id")
-    path = match_path(match_id)
+    player_id = str(data.get("player_id") or session.get('user_id'))
+    gm = get_game(match_id)
+    if gm is None:
+        emit('attack_failed', {'reason': 'match_not_active'})
+        return
+    reason = turn_error(gm, player_id, acting=True)
+    if reason:
+        emit('attack_failed', {'reason': reason})
+        return
     target = data.get("target")
-    target_pos = [target[0], target[1]]
-    players_data = json_manager.read_json(path)["players"]
-    player_char = json_manager.characters[players_data[player_id]["id"]]
+    attack_player(gm, player_id, [target[0], target[1]])
+
+
+def attack_player(gm, player_id, target_pos):
+    """player_id attacks whoever stands on target_pos ([x, y]) if in range, ending the turn."""
+    # everyone's range check and the damage are one vectorized pass; the client only
+    # offers tiles from attackable_players, but don't trust it
+    fight = CombatState.from_match(gm.state, json_manager.characters)
+    attacker = fight.index[player_id]
+    target_tile = board.POS_TILE.get(tuple(target_pos), combat.OFF_BOARD)
+    # the eliminated stay on their tile, but can't be hit
+    hit = fight.in_range(attacker) & fight.on_tile(target_tile) & fight.alive()
+    # one victim per attack, as before: the first player standing on the tile
+    hit[np.flatnonzero(hit)[1:]] = False
+    fight.attack_players(attacker, hit)
+    patches = fight.patches(hit)
+    emit_hits(gm, player_id, [(fight.player_ids[i], float(fight.health[i])) for i in np.flatnonzero(hit)])
+    # health, shield and the turn advance are applied together or not at all
+    end_turn(gm, "attack", patches, player=player_id, target=target_pos)
+
+
+def turn_error(gm, player_id, acting=False):
+    """Why player_id can't act now, None if they can. A roll commits the turn to moving
+    (or skipping when no move is possible), so attacks and abilities (acting) must come
+    before rolling, never instead of the move."""
+    if gm.turns.current() != player_id:
+        return 'not_your_turn'
+    if acting and gm.state.get("pending_roll"):
+        return 'already_rolled'
+    return None
+
+
+def emit_hits(gm, source_id, hits):
+    """health_update for each (player_id, health) an action produced; the eliminated leave the rotation."""
+    players = gm.state["players"]
+    for victim, health in hits:
+        if health <= 0:
+            gm.turns.unseat(victim)
+        socketio.emit("health_update", {"attacker": players[source_id]["user"], "target": players[victim]["user"], "user_id": victim, "current_health": health, "max_health": players[victim]["max_health"]}, room=f"match_{gm.match_id}")
+
+
+@socketio.on('ability_request')
+@match_locked
+def handle_ability_request(data):
+    """
+    Client: { match_id, player_id, target: optional [x,y] }
+    Uses the player's character ability. Targeted abilities pick the best target in range
+    when none is given. Using an ability ends the turn, like an attack.
+    """
+    match_id = data.get("match_id")
+    player_id = str(data.get("player_id") or session.get('user_id'))
+    gm = get_game(match_id)
+    if gm is None:
+        emit('ability_failed', {'reason': 'match_not_active'})
+        return
+    reason = turn_error(gm, player_id, acting=True)
+    if reason:
+        emit('ability_failed', {'reason': reason})
+        return
+    target = data.get("target")
+    target_tile = board.POS_TILE.get((target[0], target[1]), combat.OFF_BOARD) if target else None
 
-    for player in players_data:
-        if player == player_id:
-            continue
-        if players_data[player]["position"] == target_pos:
-            opp_char = json_manager.characters[players_data[player]["id"]]
-            opp_char.health = players_data[player]["health"]
-            opp_char.shield = players_data[player]["shield"]
+    result = abilities.use(gm, player_id, target_tile)
+    if "error" in result:
+        emit('ability_failed', {'reason': result["error"]})
+        return
+    socketio.emit('ability_result', {"user": gm.state["players"][player_id]["user"], "user_id": player_id, "ability": result["name"]}, room=f"match_{match_id}")
+    emit_hits(gm, player_id, result["hits"])
+    end_turn(gm, "ability", result["patches"], player=player_id, ability=result["name"])
 
-            player_char.attack_target(opp_char)
 
-            json_manager.modify_json(path, ["players", player, "health"], opp_char.health)
-            json_manager.modify_json(path, ["players", player, "shield"], opp_char.shield)
+@socketio.on('skip_turn')
+@match_locked
+def handle_skip_turn(data):
+    """Skip turn when a player in spawn doesn't roll 1 or 6."""
+    match_id = data.get("match_id")
+    player_id = str(data.get("player_id") or session.get('user_id'))
+    gm = get_game(match_id)
+    if gm is None or turn_error(gm, player_id):
+        return
 
-            socketio.emit("health_update", {"attacker": players_data[player_id]["user"], "target": players_data[player]["user"], "user_id": player, "current_health": opp_char.health, "max_health": players_data[player]["max_health"]})
+    end_turn(gm, "turn", player=player_id)
 
-            break
-    
 
-    data = json_manager.read_json(path)
-    room = f"match_{match_id}"
-    total_players = data["player_count"]
-    next_turn_ind = data["current_turn_index"] + 1
-    turn_order = data["turn_order"]
+def payload_cache_stats():
+    """Hit/miss totals of the per-match encoded snapshot caches."""
+    hits = misses = 0
+    for gm in list(active_games.values()):
+        hits += gm.payloads.hits
+        misses += gm.payloads.misses
+    return {"hits": hits, "misses": misses}
 
-    if next_turn_ind > (total_players - 1):
-        next_turn_ind = 0
 
-    json_manager.modify_json(path, ["current_turn_index"], next_turn_ind)
-    socketio.emit('turn_update', {"turn":turn_order[next_turn_ind], "user": data["players"][turn_order[next_turn_ind]]["user"]}, room=room)
+def evict_game(match_id, retire=False):
+    """Flush a match and drop it from memory. It stays live on disk and get_game rehydrates it,
+    unless retire: then it leaves live_matches in the same step, so nothing can rehydrate it
+    from the files archive_game is about to delete."""
+    gm = active_games.get(match_id)
+    if gm is None:
+        return
+    with gm.lock:
+        json_manager.checkpoint(gm)
+        gm.evicted = True
+        timers.cancel(("turn", match_id))
+        timers.cancel(("bot", match_id))
+        timers.cancel(("autopilot", match_id))
+        with active_games_lock:
+            active_games.pop(match_id, None)
+            if retire:
+                live_matches.discard(match_id)
+
+
+def archive_game(match_id, winner_id=None):
+    """Store a finished or abandoned match in Game.game_data, then remove it from memory,
+    the live index and the matches directory."""
+    path = match_path(match_id)
+    gm = active_games.get(match_id)
+    if gm is not None:
+        with gm.lock:
+            state = gm.state
+            evict_game(match_id, retire=True)
+    else:
+        with active_games_lock:
+            live_matches.discard(match_id)
+        try:
+            state = json_manager.recover_state(path)
+        except FileNotFoundError:
+            state = {}
 
+    house_id = state.get("house_id")
+    if house_id is not None:
+        now = datetime.utcnow()
+        try:
+            started_at = datetime.fromisoformat(state["satrted_at"])
+        except (KeyError, ValueError):
+            started_at = None
+        # bots have no players row
+        if winner_id and state["players"][winner_id].get("bot"):
+            winner_id = None
+        db.session.add(Game(house_id=house_id, winner_id=int(winner_id) if winner_id else None,
+                            started_at=started_at, finished_at=now, game_data=state))
+        house = House.query.get(house_id)
+        if house and house.status == 'in_progress':
+            house.status = 'finished'
+            house.finished_at = now
+        db.session.commit()
+    else:
+        # matches created before house_id was stored can't be linked to a Game row
+        app.logger.warning(f"match {match_id} has no house_id, not archived to games")
+
+    with presence_lock:
+        autopilot.difference_update({key for key in autopilot if key[0] == match_id})
+    json_manager.remove_match_files(path)
+    with active_games_lock:
+        json_manager.save_live_index(DATA_DIR, live_matches)
+    lifecycle.forget(match_id)
+
+
+def sweep_matches():
+    """Archive finished and abandoned matches, evict idle/least recently used ones."""
+    for match_id, gm in list(active_games.items()):
+        finished, winner_id = match_result(gm.state)
+        if finished:
+            if not gm.state.get("finished"):
+                # decided outside end_turn (e.g. a player removed), the room hasn't been told yet
+                finish_match(gm, winner_id)
+            archive_game(match_id, winner_id)
+    to_evict, to_abandon = lifecycle.plan(set(active_games))
+    for match_id in to_abandon:
+        archive_game(match_id)
+    for match_id in to_evict:
+        evict_game(match_id)
+
+
+def checkpoint_active_games():
+    """Background task: periodically flush dirty in-memory matches to their snapshot files
+    and run the match lifecycle sweep.
+    Between runs a match's actions only go to its journal, which each flush empties."""
+    while True:
+        socketio.sleep(CHECKPOINT_INTERVAL)
+        for match_id, gm in list(active_games.items()):
+            try:
+                json_manager.checkpoint(gm)
+            except Exception:
+                app.logger.exception(f"checkpoint failed for match {match_id}")
+        try:
+            with app.app_context():
+                sweep_matches()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("match lifecycle sweep failed")
+        app.logger.debug(f"[CACHE] match_snapshot payloads {payload_cache_stats()} resident={len(active_games)} live={len(live_matches)}")
 
-@socketio.on('skip_turn')
-def handle_skip_turn(data):
-    """Skip turn when a player in spawn doesn't roll 1 or 6."""
-    match_id = data.get("match_id")
-    player_id = data.get("player_id")
-    path = match_path(match_id)
-    
-    data = json_manager.read_json(path)
-    room = f"match_{match_id}"
-    total_players = data["player_count"]
-    next_turn_ind = data["current_turn_index"] + 1
-    turn_order = data["turn_order"]
 
-    if next_turn_ind > (total_players - 1):
-        next_turn_ind = 0
+def expire_turn(match_id, player_id):
+    """A turn ran out: pass it on unless the player acted (or the match left memory) meanwhile."""
+    gm = active_games.get(match_id)
+    if gm is None:
+        return
+    with gm.lock:
+        if gm.evicted or gm.turns.current() != player_id:
+            return
+        app.logger.info(f"turn of {player_id} in match {match_id} timed out")
+        end_turn(gm, "timeout", player=player_id)
+
+
+def bot_pool():
+    global _bot_pool
+    if _bot_pool is None:
+        # not fork: forking this multi-threaded server can copy a lock another thread
+        # holds (logging, timers, the DB pool) into a worker, which then deadlocks on it
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _bot_pool = ProcessPoolExecutor(max_workers=BOT_WORKERS, mp_context=multiprocessing.get_context(method))
+        atexit.register(_bot_pool.shutdown, wait=False, cancel_futures=True)
+    return _bot_pool
+
+
+def start_bot_turn(match_id, player_id):
+    """A bot's think delay is over: search its move in the worker pool without holding up the timers."""
+    gm = active_games.get(match_id)
+    if gm is None:
+        return
+    with gm.lock:
+        if gm.evicted or gm.turns.current() != player_id or not humans_connected(gm):
+            return
+        pos = bots.position_from_state(gm.state, player_id, dices, gm.jumps)
+    socketio.start_background_task(play_bot_turn, match_id, player_id, bot_pool().submit(bots.choose_plan, pos, BOT_BUDGET))
+
+
+def play_bot_turn(match_id, player_id, future):
+    """Wait for the bot's plan, then play it through the same steps as a human's requests."""
+    while not future.done():
+        socketio.sleep(0.02)
+    try:
+        plan = future.result()
+    except Exception:
+        app.logger.exception(f"bot search failed for {player_id} in match {match_id}")
+        plan = {"action": "roll", "moves": {}}
+    gm = active_games.get(match_id)
+    if gm is None:
+        return
+    with gm.lock, app.app_context():
+        # the turn may have timed out or the match been evicted while the bot was thinking
+        if gm.evicted or gm.turns.current() != player_id:
+            return
+        app.logger.debug(f"bot {player_id} in match {match_id}: {plan}")
+        play_plan(gm, player_id, plan)
+
+
+def play_plan(gm, player_id, plan):
+    """Carry out a plan from bots.choose_plan/quick_plan for player_id's turn (caller holds gm.lock)."""
+    if plan["action"] == "attack":
+        if turn_error(gm, player_id, acting=True):
+            end_turn(gm, "turn", player=player_id)
+        else:
+            attack_player(gm, player_id, gm.state["players"][plan["target"]]["position"])
+        return
+    pending = gm.state.get("pending_roll")
+    if pending and pending["player"] == player_id:
+        # rolled before disconnecting: move with that roll
+        value = pending["value"]
+    else:
+        result = roll_dice(gm, player_id)
+        if "reason" in result or gm.turns.current() != player_id:
+            return
+        value = result["value"]
+    tile = plan["moves"].get(value)
+    if tile is None or move_player(gm, player_id, board.TILE_POS[tile]):
+        end_turn(gm, "turn", player=player_id)
+
+
+def track_connection(sid, match_id, player_id):
+    """sid joined match_id as player_id; if the autopilot had their turns, they get them back."""
+    key = (match_id, player_id)
+    with presence_lock:
+        match_sids[sid] = key
+        player_sids[key].add(sid)
+        resumed = key in autopilot
+        autopilot.discard(key)
+    timers.cancel(("grace", key))
+    if resumed:
+        socketio.emit('autopilot', {"user_id": player_id, "active": False}, room=f"match_{match_id}")
+    gm = active_games.get(match_id)
+    if gm is not None:
+        with gm.lock:
+            # a human is back: bots and the autopilot resume if they were paused
+            arm_auto_turn(gm, gm.turns.current())
+
+
+def start_autopilot(key, _):
+    """Grace period over and the player is still gone: the autopilot takes their turns."""
+    match_id, player_id = key
+    with presence_lock:
+        # an archived match is gone for good; archive_game clears its keys under this
+        # lock after retiring it, so checking here can't leave one behind
+        if player_sids.get(key) or match_id not in live_matches:
+            return
+        autopilot.add(key)
+    gm = active_games.get(match_id)
+    if gm is None:
+        return
+    app.logger.info(f"autopilot takes over {player_id} in match {match_id}")
+    socketio.emit('autopilot', {"user_id": player_id, "active": True}, room=f"match_{match_id}")
+    with gm.lock:
+        arm_auto_turn(gm, gm.turns.current())
+
+
+def run_autopilot(match_id, player_id):
+    """Play a disconnected player's turn with bots.quick_plan, if it's still theirs."""
+    gm = active_games.get(match_id)
+    if gm is None:
+        return
+    with gm.lock:
+        if gm.evicted or gm.turns.current() != player_id or (match_id, player_id) not in autopilot or not humans_connected(gm):
+            return
+        pos = bots.position_from_state(gm.state, player_id, dices, gm.jumps)
+        # a roll made before disconnecting must be moved with, see turn_error
+        play_plan(gm, player_id, bots.quick_plan(pos, can_attack=not gm.state.get("pending_roll")))
+
+
+# timer key kind -> handler(key id, payload)
+TIMER_HANDLERS = {
+    "turn": expire_turn,
+    "bot": start_bot_turn,
+    "grace": start_autopilot,
+    "autopilot": run_autopilot,
+}
+
 
-    json_manager.modify_json(path, ["current_turn_index"], next_turn_ind)
-    socketio.emit('turn_update', {"turn": turn_order[next_turn_ind], "user": data["players"][turn_order[next_turn_ind]]["user"]}, room=room)
+def run_timers():
+    """Background task: fire due deadlines of every match from one heap.
+    Sleeps until the earliest deadline, but at most a second so new timers are picked up."""
+    while True:
+        wait = timers.next_deadline()
+        socketio.sleep(1.0 if wait is None else min(max(wait, 0.01), 1.0))
+        for (kind, key), payload in timers.pop_due():
+            try:
+                with app.app_context():
+                    TIMER_HANDLERS[kind](key, payload)
+            except Exception:
+                app.logger.exception(f"{kind} timer for {key} failed")
+
+
+def get_game(match_id):
+    """The in-memory game for match_id, rehydrated from its snapshot + journal tail
+    the first time it's touched after a restart. None if the match isn't live."""
+    gm = active_games.get(match_id)
+    if gm is not None:
+        lifecycle.touch(match_id)
+        return gm
+    if match_id not in live_matches:
+        return None
+    lifecycle.touch(match_id)
+    with active_games_lock:
+        gm = active_games.get(match_id)
+        if gm is None:
+            path = match_path(match_id)
+            try:
+                gm = GameManagerClass.from_state(match_id, path, json_manager.recover_state(path))
+            except Exception:
+                app.logger.exception(f"could not rehydrate match {match_id}")
+                return None
+            active_games[match_id] = gm
+            app.logger.info(f"rehydrated match {match_id} (seq {gm.seq})")
+            # deadlines aren't persisted: whoever's turn it was gets a fresh one
+            arm_turn_timer(gm, gm.turns.current())
+    return gm
+
+
+def start_background_tasks():
+    global _background_started
+    if _background_started:
+        return
+    _background_started = True
+    socketio.start_background_task(checkpoint_active_games)
+    socketio.start_background_task(run_timers)
 
     
 
@@ -327,6 +828,7 @@ def handle_skip_turn(data):
 def handle_connect(auth):
     sid = request.sid
     app.logger.info(f"[SOCKET] connect sid={sid} auth={auth} session_user={session.get('user_id')}")
+    start_background_tasks()
     # If client sent auth (fallback), show it
     if auth:
         app.logger.info(f"[SOCKET] auth provided: {auth}")
@@ -385,6 +887,17 @@ def on_leave_house(data):
 @socketio.on('disconnect')
 def on_disconnect():
     app.logger.debug(f"Socket disconnected: sid={request.sid}")
+    with presence_lock:
+        key = match_sids.pop(request.sid, None)
+        if key is None:
+            return
+        sids = player_sids[key]
+        sids.discard(request.sid)
+        if sids:
+            # still connected from another tab
+            return
+        del player_sids[key]
+    timers.schedule(("grace", key), RECONNECT_GRACE, None)
 
 
 @socketio.on('register_user')
@@ -1332,8 +1845,11 @@ def game():
     match_id = request.args.get('match_id')
     # Load match snapshot to pass players to template
     try:
-        path = match_path(match_id)
-        currentSnapshot = json_manager.read_json(path)
+        gm = get_game(match_id)
+        if gm is not None:
+            currentSnapshot = gm.state
+        else:
+            currentSnapshot = json_manager.read_snapshot(match_path(match_id))
     except:
         currentSnapshot = None
     return render_template('game.html', MATCH_ID=match_id, AUTH_USER_ID=session.get('user_id'), currentSnapshot=currentSnapshot)
@@ -1389,20 +1905,32 @@ def create_house():
         action = request.form.get('action')
         
         if action == 'start_game' and user_house:
-            if user_house.current_players >= 2:
+            # bots make up the numbers when lobbies are being filled
+            if user_house.current_players >= 2 or BOT_FILL_TO >= 2:
                 user_house.status = 'in_progress'
                 user_house.started_at = datetime.utcnow()
                 match_id = new_match_uuid()
                 db.session.commit()
                 path = match_path(match_id)
 
-                gm = GameManager(board_size=10)
+                gm = GameManagerClass(board_size=10)
 
-                # Store it in memory (so sockets can access)
-                active_games[match_id] = gm
+                # Save initial game state snapshot to JSON file, then keep it in memory
+                gm.load_state(match_id, path, json_manager.create_file(path, user_id, match_id))
+                fill = bots.fill_patches(gm.state, BOT_FILL_TO, gm.rng)
+                if fill:
+                    json_manager.record(gm, "bots", fill)
+                    json_manager.checkpoint(gm)
+                    # bots never send join_game, so they're placed on spawn here
+                    for bot_id, info in fill[:-1]:
+                        gm.spawn_player(bot_id[1], json_manager.characters[info["id"]], board.SPAWN_POS)
 
-                # Save initial game state snapshot to JSON file
-                json_manager.create_file(path, user_id, match_id)
+                # Store it in memory (so sockets can access)
+                with active_games_lock:
+                    active_games[match_id] = gm
+                    live_matches.add(match_id)
+                    json_manager.save_live_index(DATA_DIR, live_matches)
+                lifecycle.touch(match_id)
                 
 
                 room_name = f"house_{user_house.id}"
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Compare the dict and bitboard occupancy backends of GameManager.
+
+Run from the repo root:  python benchmarks/bench_occupancy.py
+"""
+import os, sys, random, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_manager import GameManager, BitboardGameManager
+from classes.characters import CHARACTERS
+
+PLAYERS = 6
+ROUNDS = 20000
+
+
+def fill(cls, allow_shared_tiles=False):
+    gm = cls(board_size=10, allow_shared_tiles=allow_shared_tiles)
+    for i in range(PLAYERS):
+        gm.spawn_player(str(i), CHARACTERS[1])
+    return gm
+
+
+def bench(cls):
+    random.seed(1)
+    gm = fill(cls)
+    cells = [(random.randrange(10), random.randrange(10)) for _ in range(1000)]
+    results = {}
+    results["spawn 6 (no shared tiles)"] = timeit.timeit(lambda: fill(cls), number=ROUNDS // 10) / (ROUNDS // 10)
+    results["is_occupied x1000"] = timeit.timeit(lambda: [gm.is_occupied(c) for c in cells], number=ROUNDS // 100) / (ROUNDS // 100)
+    results["occupants x1000"] = timeit.timeit(lambda: [gm.occupants(c) for c in cells], number=ROUNDS // 100) / (ROUNDS // 100)
+    results["neighbors x1000"] = timeit.timeit(lambda: [gm.neighbors(c) for c in cells], number=ROUNDS // 100) / (ROUNDS // 100)
+    results["free tile sample"] = timeit.timeit(gm._random_free_tile, number=ROUNDS) / ROUNDS
+    results["board_hash"] = timeit.timeit(gm.board_hash, number=ROUNDS) / ROUNDS
+    return results
+
+
+if __name__ == "__main__":
+    base = bench(GameManager)
+    bits = bench(BitboardGameManager)
+    print(f"{'operation':28} {'dict (us)':>12} {'bitboard (us)':>14} {'speedup':>8}")
+    for name in base:
+        print(f"{name:28} {base[name]*1e6:12.2f} {bits[name]*1e6:14.2f} {base[name]/bits[name]:7.1f}x")
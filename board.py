@@ -0,0 +1,175 @@
+# board.py
+# Geometry of the 10x10 snaking board (see Contents.md): tiles are numbered 0 -> 99
+# starting bottom-left, rows alternate direction, so row 0 runs left->right,
+# row 1 right->left, and so on. Positions are (x, y) with (0, 0) bottom-left,
+# the same convention game.js uses.
+from functools import lru_cache
+from typing import Tuple, List
+
+Position = Tuple[int, int]
+
+BOARD_SIZE = 10
+TILE_COUNT = BOARD_SIZE * BOARD_SIZE
+LAST_TILE = TILE_COUNT - 1
+# every tile bit set, for bitboards indexed by tile number
+FULL_MASK = (1 << TILE_COUNT) - 1
+
+# tile -> (x, y) and (x, y) -> tile, precomputed once
+TILE_POS: List[Position] = []
+for _tile in range(TILE_COUNT):
+    _y, _col = divmod(_tile, BOARD_SIZE)
+    TILE_POS.append((_col if _y % 2 == 0 else BOARD_SIZE - 1 - _col, _y))
+POS_TILE = {pos: tile for tile, pos in enumerate(TILE_POS)}
+
+
+def in_bounds(pos) -> bool:
+    return 0 <= pos[0] < BOARD_SIZE and 0 <= pos[1] < BOARD_SIZE
+
+
+def tile_of(pos) -> int:
+    """Tile number of an on-board (x, y). Raises KeyError for off-board positions like spawn (-1, -1)."""
+    return POS_TILE[(pos[0], pos[1])]
+
+
+def pos_of(tile: int) -> Position:
+    return TILE_POS[tile]
+
+
+# (min_range, max_range) -> tuple of 100 bitmasks, one per origin tile
+_RANGE_MASKS = {}
+
+
+def range_masks(min_range: int, max_range: int) -> Tuple[int, ...]:
+    """Attackable tiles for every origin tile, as tile bitmasks.
+
+    A target is in range when it is in the same row or column at a distance
+    between min_range and max_range (inclusive); distance 0 is the attacker's own
+    tile. Built once per distinct range and reused by every match.
+    """
+    key = (min_range, max_range)
+    masks = _RANGE_MASKS.get(key)
+    if masks is None:
+        built = []
+        for x, y in TILE_POS:
+            mask = 0
+            for d in range(min_range, min(max_range, BOARD_SIZE - 1) + 1):
+                for pos in ((x + d, y), (x - d, y), (x, y + d), (x, y - d)):
+                    if in_bounds(pos):
+                        mask |= 1 << POS_TILE[pos]
+            built.append(mask)
+        masks = _RANGE_MASKS[key] = tuple(built)
+    return masks
+
+
+# ---------------------
+# movement
+# ---------------------
+# players start off the board on the spawn square (-1, -1)
+SPAWN_POS: Position = (-1, -1)
+SPAWN = -1
+# rolls that bring a player from spawn onto tile 0
+ENTRY_ROLLS = (1, 6)
+# identity jump table: no ladders or snakes
+NO_JUMPS: Tuple[int, ...] = tuple(range(TILE_COUNT))
+
+
+def _build_moves():
+    """_MOVES[origin + 1][roll]: tile bitmask of every legal move target, origin SPAWN
+    included. A roll of r from tile t may stop on any of t+1 .. t+r along the snake
+    path, capped at the last tile; from spawn only ENTRY_ROLLS enter, onto tile 0."""
+    spawn = tuple(1 if roll in ENTRY_ROLLS else 0 for roll in range(TILE_COUNT))
+    table = [spawn]
+    for tile in range(TILE_COUNT):
+        below = (1 << (tile + 1)) - 1
+        table.append(tuple(((1 << (min(tile + roll, LAST_TILE) + 1)) - 1) & ~below for roll in range(TILE_COUNT)))
+    return tuple(table)
+
+
+_MOVES = _build_moves()
+
+
+def origin_tile(pos) -> int:
+    """Tile of pos, or SPAWN for the spawn square."""
+    return POS_TILE.get((pos[0], pos[1]), SPAWN)
+
+
+def move_targets(origin: int, roll: int) -> int:
+    """Bitmask of the tiles a roll lets a player at origin (a tile or SPAWN) stop on."""
+    if roll <= 0:
+        return 0
+    return _MOVES[origin + 1][min(roll, LAST_TILE)]
+
+
+def can_move(origin: int, roll: int, target: int) -> bool:
+    return target >= 0 and bool(move_targets(origin, roll) >> target & 1)
+
+
+def land(target: int, jumps=None) -> int:
+    """Where a player stopping on target ends up after a ladder or snake (jumps: 100-entry table)."""
+    return target if jumps is None else jumps[target]
+
+
+# ---------------------
+# ladders and snakes
+# ---------------------
+# A layout is {"ladders": [[from, to], ...], "snakes": [[from, to], ...]} (tile numbers), as
+# stored in the match document. compile_layout turns it into a flat jump table: jumps[t] is
+# where a player stopping on t ends up, chains already followed, so a move is one lookup.
+CLASSIC_LAYOUT = {
+    "ladders": [[3, 21], [8, 29], [27, 55], [35, 44], [50, 68], [71, 90], [79, 97]],
+    "snakes": [[31, 9], [46, 24], [62, 18], [73, 52], [87, 56], [94, 74], [98, 77]],
+}
+
+
+def layout_key(layout):
+    """Canonical hashable form of a layout; equal layouts share one compiled table."""
+    return (tuple(sorted(map(tuple, layout.get("ladders", ())))),
+            tuple(sorted(map(tuple, layout.get("snakes", ())))))
+
+
+def compile_layout(layout) -> Tuple[int, ...]:
+    """The jump table of a layout; None or an empty layout gives NO_JUMPS.
+    Tables are cached by layout_key and immutable, so matches on one layout share one."""
+    if not layout:
+        return NO_JUMPS
+    return _compile(*layout_key(layout))
+
+
+@lru_cache(maxsize=1024)
+def _compile(ladders, snakes) -> Tuple[int, ...]:
+    jump = {}
+    for kind, pairs, up in (("ladder", ladders, True), ("snake", snakes, False)):
+        for start, end in pairs:
+            if not (0 < start < LAST_TILE and 0 <= end <= LAST_TILE):
+                raise ValueError("%s %d->%d leaves the board or starts on the first/last tile" % (kind, start, end))
+            if (end > start) != up:
+                raise ValueError("%s %d->%d goes the wrong way" % (kind, start, end))
+            if start in jump:
+                raise ValueError("two jumps start on tile %d" % start)
+            jump[start] = end
+    table = list(range(TILE_COUNT))
+    for start in jump:
+        seen = {start}
+        tile = jump[start]
+        # landing on the start of another jump takes that one too
+        while tile in jump:
+            if tile in seen:
+                raise ValueError("jump cycle through tile %d" % tile)
+            seen.add(tile)
+            tile = jump[tile]
+        table[start] = tile
+    return tuple(table)
+
+
+def random_layout(rng, ladders: int = 6, snakes: int = 6):
+    """A Chaos mode layout drawn from rng. Every start and end is a distinct tile,
+    so it never contains a chain or a cycle."""
+    tiles = rng.sample(range(1, LAST_TILE), 2 * (ladders + snakes))
+    layout = {"ladders": [], "snakes": []}
+    for i in range(ladders + snakes):
+        low, high = sorted(tiles[2 * i: 2 * i + 2])
+        if i < ladders:
+            layout["ladders"].append([low, high])
+        else:
+            layout["snakes"].append([high, low])
+    return layout
@@ -0,0 +1,261 @@
+# bots.py
+# Computer players. choose_plan() searches the bot's turn with expectimax: the bot's and the
+# opponents' turns are max/min nodes (opponents are assumed to play against the bot), a roll
+# is a chance node over the die's exact distribution. Positions are Zobrist-hashed into a
+# transposition table, and iterative deepening stops at a hard time budget. Everything here
+# is plain data and module-level functions, so the search runs in a process pool worker and
+# app.py only ships a Position in and a plan out.
+import random, time
+from typing import Dict, List, Optional, Tuple
+
+import board
+from classes.characters import CHARACTERS
+
+SPAWN = board.SPAWN
+WIN = 1000.0
+
+# Zobrist keys: one per (seat, tile or spawn) and per seat to move; health and shield
+# are mixed in with _mix since they aren't small enumerable sets
+_zrng = random.Random(0x5EED)
+MAX_SEATS = 8
+Z_TILE = [[_zrng.getrandbits(64) for _ in range(board.TILE_COUNT + 1)] for _ in range(MAX_SEATS)]
+Z_TURN = [_zrng.getrandbits(64) for _ in range(MAX_SEATS)]
+_MASK64 = (1 << 64) - 1
+# _mix salt, so a seat's shield never keys the same as its health
+SALT_HEALTH = 0
+SALT_SHIELD = 0xD6E8FEB86659FD93
+
+
+def _mix(seat: int, value: float, salt: int = SALT_HEALTH) -> int:
+    """64-bit key of (seat, value to 0.1, salt), splitmix64 style."""
+    z = (seat * 0x9E3779B97F4A7C15 + int(round(value * 10)) * 0xBF58476D1CE4E5B9 + salt) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+class Position:
+    """What the search needs of a match, in seat order (turn_order)."""
+    __slots__ = ("players", "tiles", "health", "shield", "attack", "reach", "dice", "jumps", "turn", "hash")
+
+    def __init__(self, players, tiles, health, shield, attack, reach, dice, jumps, turn, hash=None):
+        self.players = players        # player ids
+        self.tiles = tiles            # tile or SPAWN
+        self.health = health
+        self.shield = shield
+        self.attack = attack
+        self.reach = reach            # per seat: 100 attack-range bitmasks by origin tile
+        self.dice = dice              # per seat: ((value, probability), ...)
+        self.jumps = jumps
+        self.turn = turn              # seat to move
+        self.hash = self._full_hash() if hash is None else hash
+
+    def _full_hash(self) -> int:
+        h = Z_TURN[self.turn]
+        for seat, tile in enumerate(self.tiles):
+            h ^= Z_TILE[seat][tile + 1] ^ _mix(seat, self.health[seat])
+            h ^= _mix(seat, self.shield[seat], SALT_SHIELD)
+        return h
+
+    def child(self, tiles=None, health=None, shield=None) -> "Position":
+        """Next position, seat to move advanced past the eliminated; hash updated incrementally."""
+        tiles = tiles or self.tiles
+        health = health or self.health
+        shield = shield or self.shield
+        h = self.hash ^ Z_TURN[self.turn]
+        for seat in range(len(tiles)):
+            if tiles[seat] != self.tiles[seat]:
+                h ^= Z_TILE[seat][self.tiles[seat] + 1] ^ Z_TILE[seat][tiles[seat] + 1]
+            if health[seat] != self.health[seat]:
+                h ^= _mix(seat, self.health[seat]) ^ _mix(seat, health[seat])
+            if shield[seat] != self.shield[seat]:
+                h ^= _mix(seat, self.shield[seat], SALT_SHIELD) ^ _mix(seat, shield[seat], SALT_SHIELD)
+        turn = self.turn
+        for _ in range(len(tiles)):
+            turn = (turn + 1) % len(tiles)
+            if health[turn] > 0:
+                break
+        return Position(self.players, tiles, health, shield, self.attack, self.reach,
+                        self.dice, self.jumps, turn, h ^ Z_TURN[turn])
+
+
+def position_from_state(state, player_id: str, dice_by_id, jumps) -> Position:
+    """Search root for player_id's turn; dice_by_id maps dice_id -> object with distribution()."""
+    order = state["turn_order"]
+    players = state["players"]
+    tiles, health, shield, attack, reach, dice = [], [], [], [], [], []
+    for pid in order:
+        info = players[pid]
+        char = CHARACTERS[info["id"]]
+        tiles.append(board.origin_tile(info["position"]))
+        health.append(float(info["health"]))
+        shield.append(float(info["shield"]))
+        attack.append(char.attack + info.get("attack_bonus", 0))
+        reach.append(board.range_masks(*char.range))
+        dist = dice_by_id[info.get("dice_id", 1)].distribution()
+        dice.append(tuple((value, float(p)) for value, p in dist.items()))
+    return Position(list(order), tuple(tiles), tuple(health), tuple(shield), tuple(attack), reach,
+                    dice, tuple(jumps), order.index(player_id))
+
+
+def winner(pos: Position) -> Optional[int]:
+    alive = [seat for seat, h in enumerate(pos.health) if h > 0]
+    for seat in alive:
+        if pos.tiles[seat] == board.LAST_TILE:
+            return seat
+    if len(alive) == 1:
+        return alive[0]
+    return None
+
+
+def evaluate(pos: Position, me: int) -> float:
+    """Heuristic value for seat me: progress along the path and health, relative to the best opponent."""
+    won = winner(pos)
+    if won is not None:
+        return WIN if won == me else -WIN
+    def score(seat):
+        if pos.health[seat] <= 0:
+            return -100.0
+        return (pos.tiles[seat] + 1) + 0.5 * pos.health[seat]
+    best_opp = max(score(seat) for seat in range(len(pos.tiles)) if seat != me)
+    return score(me) - best_opp
+
+
+def targets(pos: Position, seat: int) -> List[int]:
+    origin = pos.tiles[seat]
+    if origin == SPAWN:
+        return []
+    reach = pos.reach[seat][origin]
+    return [s for s, tile in enumerate(pos.tiles)
+            if s != seat and tile != SPAWN and pos.health[s] > 0 and reach >> tile & 1]
+
+
+def attacked(pos: Position, seat: int, victim: int) -> Position:
+    dmg = pos.attack[seat]
+    health, shield = list(pos.health), list(pos.shield)
+    # Characters.take_damage
+    health[victim] -= max(0, dmg - shield[victim] / 100 * dmg)
+    shield[victim] = max(0, shield[victim] - dmg * 0.1)
+    return pos.child(health=tuple(health), shield=tuple(shield))
+
+
+def landings(pos: Position, seat: int, roll: int) -> List[Tuple[int, int]]:
+    """(end, stop) for every distinct tile seat can end up on with this roll, farthest first:
+    stop is the tile to move to, end where the ladder or snake there leaves it."""
+    mask = board.move_targets(pos.tiles[seat], roll)
+    ends = {}
+    while mask:
+        stop = (mask & -mask).bit_length() - 1
+        ends.setdefault(pos.jumps[stop], stop)
+        mask &= mask - 1
+    return sorted(ends.items(), reverse=True)
+
+
+def moved(pos: Position, seat: int, tile: int) -> Position:
+    tiles = list(pos.tiles)
+    tiles[seat] = tile
+    return pos.child(tiles=tuple(tiles))
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+class Search:
+    def __init__(self, me: int, deadline: float):
+        self.me = me
+        self.deadline = deadline
+        # Zobrist hash -> (depth searched, value)
+        self.table: Dict[int, Tuple[int, float]] = {}
+        self.nodes = 0
+
+    def value(self, pos: Position, depth: int) -> float:
+        self.nodes += 1
+        if self.nodes & 255 == 0 and time.monotonic() > self.deadline:
+            raise _OutOfTime
+        if depth == 0 or winner(pos) is not None:
+            return evaluate(pos, self.me)
+        cached = self.table.get(pos.hash)
+        if cached is not None and cached[0] >= depth:
+            return cached[1]
+        pick = max if pos.turn == self.me else min
+        options = [self.roll_value(pos, depth)]
+        options += [self.value(attacked(pos, pos.turn, victim), depth - 1) for victim in targets(pos, pos.turn)]
+        result = pick(options)
+        self.table[pos.hash] = (depth, result)
+        return result
+
+    def roll_value(self, pos: Position, depth: int) -> float:
+        """Chance node: expected value over the die, each outcome followed by its best move."""
+        return sum(p * self.best_move(pos, roll, depth)[1] for roll, p in pos.dice[pos.turn])
+
+    def best_move(self, pos: Position, roll: int, depth: int) -> Tuple[Optional[int], float]:
+        seat = pos.turn
+        ends = landings(pos, seat, roll)
+        if not ends:
+            # stuck in spawn: the turn just passes
+            return None, self.value(pos.child(), depth - 1)
+        pick = max if seat == self.me else min
+        scored = [(stop, self.value(moved(pos, seat, end), depth - 1)) for end, stop in ends]
+        return pick(scored, key=lambda item: item[1])
+
+
+def quick_plan(pos: Position, can_attack: bool = True) -> Dict:
+    """choose_plan without the search, in microseconds: attack the nearest opponent in range,
+    otherwise roll and go for the farthest tile. The fallback when the search runs out of
+    time at depth 1, and the autopilot for disconnected players."""
+    me = pos.turn
+    in_range = targets(pos, me) if can_attack else []
+    if in_range:
+        x, y = board.TILE_POS[pos.tiles[me]]
+        def distance(seat):
+            tx, ty = board.TILE_POS[pos.tiles[seat]]
+            return abs(tx - x) + abs(ty - y)
+        return {"action": "attack", "target": pos.players[min(in_range, key=distance)]}
+    return {"action": "roll", "moves": {roll: (landings(pos, me, roll) or [(None, None)])[0][1] for roll, _ in pos.dice[me]}}
+
+
+def choose_plan(pos: Position, budget: float = 0.5, max_depth: int = 12) -> Dict:
+    """Best action for the seat to move within budget seconds:
+    {"action": "attack", "target": player_id} or {"action": "roll", "moves": {roll: tile or None}}.
+    A roll plan holds the tile to move to for every outcome (None: no move, the turn passes),
+    so no second search is needed once the die is thrown."""
+    me = pos.turn
+    deadline = time.monotonic() + budget
+    plan = quick_plan(pos)
+    search = Search(me, deadline)
+    for depth in range(1, max_depth + 1):
+        try:
+            best_value = search.roll_value(pos, depth)
+            best = {"action": "roll", "moves": {roll: search.best_move(pos, roll, depth)[0] for roll, _ in pos.dice[me]}}
+            for victim in targets(pos, me):
+                value = search.value(attacked(pos, me, victim), depth - 1)
+                if value > best_value:
+                    best_value, best = value, {"action": "attack", "target": pos.players[victim]}
+        except _OutOfTime:
+            break
+        plan = dict(best, depth=depth, value=best_value)
+        if abs(best_value) >= WIN:
+            break
+    plan["nodes"] = search.nodes
+    return plan
+
+
+# ---------------------
+# lobby filling
+# ---------------------
+def fill_patches(state, fill_to: int, rng) -> List[Tuple[List, object]]:
+    """Patches adding bot players until the match has fill_to players."""
+    patches = []
+    count = len(state["players"])
+    for n in range(1, fill_to - count + 1):
+        char = CHARACTERS[rng.choice(sorted(CHARACTERS))]
+        pid = "bot-%d" % n
+        patches.append((["players", pid], {
+            "user": "Bot %s" % char.name, "id": char.id, "name": char.name, "bot": True,
+            "max_health": char.health, "health": char.health, "shield": char.shield,
+            "dice_id": 1, "position": list(board.SPAWN_POS),
+        }))
+    if patches:
+        patches.append((["player_count"], count + len(patches)))
+    return patches
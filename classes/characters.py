@@ -164,3 +164,30 @@ class Padupie(Characters):
 
     def special_ability(self):
         print(f"{self.name} uses Bomb Attack!")
+
+
+class CharacterDef:
+    """Read-only stats of one character type.
+
+    A single instance per type is shared by every match, so nothing per-match may
+    live here: health and shield are in the match document and combat.CombatState."""
+    __slots__ = ("id", "name", "type", "health", "attack", "shield", "range")
+
+    def __init__(self, id, name, type, health, attack, shield, range):
+        for field, value in zip(self.__slots__, (id, name, type, health, attack, shield, tuple(range))):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, field, value):
+        raise AttributeError("CharacterDef is read-only")
+
+    def __repr__(self):
+        return f"CharacterDef({self.id}, {self.name!r})"
+
+    @classmethod
+    def from_class(cls, char_cls):
+        char = char_cls()
+        return cls(char.id, char.name, char.type, char.health, char.attack, char.shield, char.range)
+
+
+# character id -> definition; the classes above remain where the stats are written down
+CHARACTERS = {d.id: d for d in map(CharacterDef.from_class, Characters.__subclasses__())}
@@ -1,44 +1,160 @@
 import random
+from fractions import Fraction
+import numpy as np
 
-class FortuneCore:
-    def __init__(self, sides=6):
-        self.sides = sides
-        self.id = 1
 
-    def roll(self):
-        return random.randint(1, self.sides)
+class RollPool:
+    """Pre-drawn rolls for one RNG stream, refilled in bulk by a NumPy Generator.
 
-class RiskRoller(FortuneCore):
-    def __init__(self, sides=3):
-        super().__init__(sides)
-        self.id = 2
+    Has the randint(a, b) the dice call on their rng, so a pool can be passed
+    anywhere a random.Random can: dice.roll_outcome(pool). Each (a, b) range keeps
+    its own buffer of `size` draws."""
+    def __init__(self, seed=None, size: int = 4096):
+        self.gen = np.random.default_rng(seed)
+        self.size = size
+        # (a, b) -> [buffer, next index]
+        self.buffers = {}
 
-class BlazeCube(FortuneCore):
-    def __init__(self, sides=6):
-        super().__init__(sides)
-        self.id = 3
+    def randint(self, a: int, b: int) -> int:
+        entry = self.buffers.get((a, b))
+        if entry is None or entry[1] == self.size:
+            entry = [self.gen.integers(a, b + 1, size=self.size).tolist(), 0]
+            self.buffers[(a, b)] = entry
+        value = entry[0][entry[1]]
+        entry[1] += 1
+        return value
 
-    def roll(self):
-        print("Attack Boosted! for next attack")
-        return super().roll()
+    def random(self) -> float:
+        """Uniform float in [0, 1), like random.Random.random."""
+        entry = self.buffers.get(None)
+        if entry is None or entry[1] == self.size:
+            entry = self.buffers[None] = [self.gen.random(size=self.size).tolist(), 0]
+        value = entry[0][entry[1]]
+        entry[1] += 1
+        return value
 
-class FrostPrism(FortuneCore):
-    def __init__(self, sides=6):
-        super().__init__(sides)
-        self.id = 4
 
-    def roll(self):
-        print("Slow attack Enabled for next attack!")
-        return super().roll()
+class AliasTable:
+    """Walker's alias method: draw index i with probability weights[i] / sum(weights) in O(1),
+    one randint and one random per draw, whatever the number of weights.
+
+    Built in O(n) (Vose's variant): every column holds its own index with probability prob[i]
+    and its alias otherwise."""
+    __slots__ = ("prob", "alias")
+
+    def __init__(self, weights):
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0 or min(weights) < 0:
+            raise ValueError("weights must be non-negative with a positive sum")
+        scaled = [w * n / total for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            lo, hi = small.pop(), large.pop()
+            self.prob[lo] = scaled[lo]
+            self.alias[lo] = hi
+            scaled[hi] -= 1.0 - scaled[lo]
+            (small if scaled[hi] < 1.0 else large).append(hi)
+        # whatever is left is 1.0 up to rounding and keeps prob 1.0
+
+    def sample(self, rng) -> int:
+        i = rng.randint(0, len(self.prob) - 1)
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class WeightedDice:
+    """A die as a table of weighted outcomes, e.g. from the Dice.outcomes column:
+    [{"value": 3, "weight": 2}, {"value": 1, "weight": 1, "backfire": 10}, ...]
+
+    value is how far the roll moves, weight its relative chance. Optional per outcome:
+    extra_turn (the roller goes again) and backfire (damage the roller takes).
+    Outcomes may repeat a value, e.g. doubles and non-doubles of the same 2d6 sum."""
+
+    def __init__(self, id, name, outcomes):
+        self.id = id
+        self.name = name
+        self.outcomes = [
+            {"value": int(o["value"]), "weight": o["weight"], "extra_turn": bool(o.get("extra_turn")),
+             "backfire": o.get("backfire", 0)}
+            for o in outcomes
+        ]
+        self.table = AliasTable([o["weight"] for o in self.outcomes])
+
+    def roll_outcome(self, rng=None) -> dict:
+        """rng: the match's random.Random (or a RollPool); the global random module when not given."""
+        return self.outcomes[self.table.sample(rng or random)]
+
+    def roll(self, rng=None):
+        return self.roll_outcome(rng)["value"]
+
+    def _chances(self):
+        total = sum(Fraction(str(o["weight"])) for o in self.outcomes)
+        return [(o, Fraction(str(o["weight"])) / total) for o in self.outcomes]
+
+    def distribution(self):
+        """Exact {value: probability} of one roll."""
+        dist = {}
+        for o, p in self._chances():
+            dist[o["value"]] = dist.get(o["value"], 0) + p
+        return dict(sorted(dist.items()))
+
+    def expected_value(self) -> Fraction:
+        return sum(value * p for value, p in self.distribution().items())
+
+    def extra_turn_chance(self) -> Fraction:
+        return sum((p for o, p in self._chances() if o["extra_turn"]), Fraction(0))
+
+    def backfire_chance(self) -> Fraction:
+        return sum((p for o, p in self._chances() if o["backfire"]), Fraction(0))
+
+
+def _faces(sides):
+    return [{"value": face, "weight": 1} for face in range(1, sides + 1)]
+
+
+def _two_dice(sides):
+    """Sum of two dice; doubles earn another turn."""
+    return [{"value": a + b, "weight": 1, "extra_turn": a == b}
+            for a in range(1, sides + 1) for b in range(1, sides + 1)]
+
+
+# outcome tables of the dice that shipped before Dice.outcomes existed, by Dice.name;
+# rows without outcomes fall back to these (see junk/migrate_add_dice_outcomes.py)
+DEFAULT_OUTCOMES = {
+    "Fortune Core": _faces(6),
+    # cursed: big rolls are likelier, but a 1 hurts
+    "Risk Roller": [
+        {"value": 1, "weight": 2, "backfire": 10},
+        {"value": 2, "weight": 1},
+        {"value": 3, "weight": 1},
+        {"value": 5, "weight": 2},
+        {"value": 6, "weight": 2},
+    ],
+    "Blaze Cube": _faces(6),
+    "Frost Prism": _faces(6),
+    "Double Fortune Core": _two_dice(6),
+}
+# ids the dice have always had in match documents (dice_id)
+DEFAULT_IDS = {"Fortune Core": 1, "Risk Roller": 2, "Blaze Cube": 3, "Frost Prism": 4, "Double Fortune Core": 5}
+DEFAULT_DICE = {DEFAULT_IDS[name]: WeightedDice(DEFAULT_IDS[name], name, outcomes)
+                for name, outcomes in DEFAULT_OUTCOMES.items()}
+
+
+def load_dice(rows):
+    """dice_id -> WeightedDice from Dice rows (anything with id, name and outcomes), on top of
+    DEFAULT_DICE. A row without outcomes uses DEFAULT_OUTCOMES for its name; unknown ones are skipped."""
+    dice = dict(DEFAULT_DICE)
+    for row in rows:
+        outcomes = row.outcomes or DEFAULT_OUTCOMES.get(row.name)
+        if outcomes:
+            dice[row.id] = WeightedDice(row.id, row.name, outcomes)
+    return dice
+
 
-class DoubleFortuneCore(FortuneCore):
+class FortuneCore(WeightedDice):
+    """The plain die every character starts with."""
     def __init__(self, sides=6):
-        super().__init__(sides)
-        self.id = 5
-
-    def roll(self):
-        n1 = super().roll()
-        n2 = super().roll()
-        print("Rolling first Dice:", n1)
-        print("Rolling second Dice:", n2)
-        return (n1 + n2)
+        super().__init__(1, "Fortune Core", _faces(sides))
@@ -0,0 +1,111 @@
+# combat.py
+# Vectorized combat over every player of a match at once (NumPy struct-of-arrays).
+# Same rules as Characters.take_damage and the row/column range check in board.range_masks,
+# but range checks, area effects and damage are single array operations, so the same code
+# serves the live attack handler and bulk simulation.
+import numpy as np
+import board
+
+_XY = np.array(board.TILE_POS)
+# DIST[a, b]: Manhattan distance between tiles a and b
+DIST = np.abs(_XY[:, None, :] - _XY[None, :, :]).sum(axis=2)
+# ALIGNED[a, b]: tiles a and b share a row or a column (attacks go in straight lines)
+ALIGNED = (_XY[:, None, 0] == _XY[None, :, 0]) | (_XY[:, None, 1] == _XY[None, :, 1])
+
+OFF_BOARD = -1
+
+
+def take_damage(health, shield, damage, pierce=False):
+    """Characters.take_damage over arrays: shield% absorbs damage, then wears down by 10% of the hit.
+    A piercing hit isn't absorbed but still wears the shield. Returns (health, shield, effective_damage)."""
+    damage = np.asarray(damage, dtype=float)
+    effective = np.broadcast_to(damage, np.shape(health)) if pierce else np.maximum(0, damage - (shield / 100) * damage)
+    return health - effective, np.maximum(0, shield - damage * 0.1), effective
+
+
+class CombatState:
+    """Positions, health, shield and stats of one match's players as parallel arrays."""
+    __slots__ = ("player_ids", "index", "tiles", "health", "shield", "attack", "min_range", "max_range",
+                 "on_board", "_safe_tiles")
+
+    def __init__(self, player_ids, tiles, health, shield, attack, min_range, max_range):
+        self.player_ids = list(player_ids)
+        self.index = {pid: i for i, pid in enumerate(self.player_ids)}
+        self.tiles = np.asarray(tiles, dtype=np.int16)
+        self.health = np.asarray(health, dtype=float)
+        self.shield = np.asarray(shield, dtype=float)
+        self.attack = np.asarray(attack, dtype=float)
+        self.min_range = np.asarray(min_range, dtype=np.int16)
+        self.max_range = np.asarray(max_range, dtype=np.int16)
+        self.on_board = self.tiles != OFF_BOARD
+        # tile to index DIST/ALIGNED with; off-board rows are masked out by on_board
+        self._safe_tiles = np.where(self.on_board, self.tiles, 0)
+
+    @classmethod
+    def from_match(cls, state, characters):
+        """Build from a match document; characters maps character id -> definition."""
+        ids, tiles, health, shield, attack, lo, hi = [], [], [], [], [], [], []
+        for pid, info in state["players"].items():
+            char = characters[info["id"]]
+            ids.append(pid)
+            tiles.append(board.POS_TILE.get(tuple(info["position"]), OFF_BOARD))
+            health.append(info["health"])
+            shield.append(info["shield"])
+            # plus any active attack buff (Beaster's Rage), see game_manager.EffectEngine
+            attack.append(char.attack + info.get("attack_bonus", 0))
+            lo.append(char.range[0])
+            hi.append(char.range[1])
+        return cls(ids, tiles, health, shield, attack, lo, hi)
+
+    def move(self, player: int, tile: int):
+        """Put player on tile (OFF_BOARD for spawn), keeping the derived masks in step."""
+        self.tiles[player] = tile
+        self.on_board[player] = tile != OFF_BOARD
+        self._safe_tiles[player] = tile if tile != OFF_BOARD else 0
+
+    def alive(self):
+        return self.health > 0
+
+    def in_range(self, attacker: int):
+        """Mask of players attacker can hit: on the board, not attacker, in line and within range."""
+        if not self.on_board[attacker]:
+            return np.zeros(len(self.player_ids), dtype=bool)
+        origin = self._safe_tiles[attacker]
+        dist = DIST[origin, self._safe_tiles]
+        mask = self.on_board & ALIGNED[origin, self._safe_tiles]
+        mask &= (dist >= self.min_range[attacker]) & (dist <= self.max_range[attacker])
+        mask[attacker] = False
+        return mask
+
+    def on_tile(self, tile):
+        return self.tiles == tile
+
+    def area(self, tile: int, radius: int):
+        """Mask of on-board players within Manhattan radius of tile (Padupie's bombs)."""
+        return self.on_board & (DIST[tile, self._safe_tiles] <= radius)
+
+    def hit(self, mask, damage, pierce=False):
+        """Apply damage to every player in mask in one pass. Returns the effective damage per player."""
+        health, shield, effective = take_damage(self.health[mask], self.shield[mask], damage, pierce)
+        self.health[mask] = health
+        self.shield[mask] = shield
+        return effective
+
+    def attack_players(self, attacker: int, mask, multiplier: float = 1.0, pierce=False):
+        return self.hit(mask, self.attack[attacker] * multiplier, pierce)
+
+    def bomb(self, attacker: int, tile: int, radius: int = 1):
+        """Area attack centred on tile; hits every other living player around it."""
+        mask = self.area(tile, radius) & self.alive()
+        mask[attacker] = False
+        self.attack_players(attacker, mask)
+        return mask
+
+    def patches(self, mask):
+        """(path, value) patches writing health/shield of the players in mask back to the match document."""
+        out = []
+        for i in np.flatnonzero(mask):
+            pid = self.player_ids[i]
+            out.append((["players", pid, "health"], float(self.health[i])))
+            out.append((["players", pid, "shield"], float(self.shield[i])))
+        return out
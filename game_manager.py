@@ -1,22 +1,242 @@
 # game_manager.py
 from typing import Tuple, Dict, List, Optional, Any
-from threading import Lock
+from threading import RLock
 from classes.dice import FortuneCore
-from classes.characters import Characters
-import random
+from classes.characters import CharacterDef, CHARACTERS
+import random, json
+import board
 
 Position = Tuple[int, int]
+# match document keys that never leave the server (see encoded_state)
+SERVER_ONLY = frozenset({"rng_seed"})
+
+
+class PayloadCache:
+    """Encoded socket payloads of one match, keyed by kind and state version.
+
+    A given version is serialized once and the same bytes are reused for every
+    room emit, rejoin and resync until the state moves on."""
+    def __init__(self):
+        # kind -> (version, payload); older versions are never asked for again
+        self.entries: Dict[str, Tuple[int, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind: str, version: int, build) -> Any:
+        cached = self.entries.get(kind)
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        payload = build()
+        self.entries[kind] = (version, payload)
+        return payload
+
+
+class TurnScheduler:
+    """Whose turn it is, over the match document's turn_order.
+
+    Seated players form a ring (next/prev links), so advancing is a pointer hop
+    instead of an index wrap at player_count. Eliminated players (health <= 0)
+    are unlinked by unseat() when they're hit, or the first time advance meets
+    them, and extra turns granted by dice are spent before the seat moves on.
+    Disconnected players keep their seat; app.py's autopilot plays their turns.
+    advance() only returns patches; the caller records them with its own action,
+    so a turn change costs one journal entry and one checkpoint write."""
+    def __init__(self, gm: "GameManager"):
+        self.gm = gm
+        self._next: Dict[str, str] = {}
+        self._prev: Dict[str, str] = {}
+        self._seat: Dict[str, int] = {}
+        self.seated: set = set()
+        self.reset()
+
+    def reset(self):
+        """Rebuild the ring from state; called whenever turn_order is replaced."""
+        order = self.gm.state.get("turn_order", [])
+        self._next = {pid: order[(i + 1) % len(order)] for i, pid in enumerate(order)}
+        self._prev = {pid: order[i - 1] for i, pid in enumerate(order)}
+        self._seat = {pid: i for i, pid in enumerate(order)}
+        players = self.gm.state.get("players", {})
+        self.seated = {pid for pid in order if players[pid].get("health", 1) > 0}
+
+    def current(self) -> Optional[str]:
+        """Whose turn it is; None before anyone joined and once the match is over."""
+        order = self.gm.state.get("turn_order")
+        if not order or self.gm.state.get("finished"):
+            return None
+        return order[self.gm.state.get("current_turn_index", 0)]
+
+    def _alive(self, player_id: str) -> bool:
+        return self.gm.state["players"][player_id].get("health", 1) > 0
+
+    def unseat(self, player_id: str):
+        """Take a player out of the rotation (eliminated or removed).
+        Their own links stay, so advancing from them still finds the next seat."""
+        if player_id not in self.seated:
+            return
+        self.seated.discard(player_id)
+        prev, nxt = self._prev[player_id], self._next[player_id]
+        self._next[prev] = nxt
+        self._prev[nxt] = prev
+
+    def grant_extra_turn(self, player_id: str) -> List[Tuple[List[Any], Any]]:
+        """Patches giving player_id one more turn before the seat moves on."""
+        extra = self.gm.state.get("extra_turns", {})
+        return [(["extra_turns"], dict(extra, **{player_id: extra.get(player_id, 0) + 1}))]
+
+    def advance(self) -> Tuple[Optional[str], List[Tuple[List[Any], Any]]]:
+        """The player who moves next and the patches that make it so, including
+        the new turn number and the status effects that expire on it."""
+        state = self.gm.state
+        current = self.current()
+        if current is None:
+            return None, []
+        turn_no = state.get("turn_no", 0) + 1
+        new_turn = [(["turn_no"], turn_no)] + self.gm.effects.expire(turn_no)
+        if state.get("pending_roll"):
+            # a roll that wasn't used by the end of the turn is lost
+            new_turn.append((["pending_roll"], None))
+        extra = state.get("extra_turns", {})
+        if extra.get(current) and current in self.seated and self._alive(current):
+            left = dict(extra)
+            left[current] -= 1
+            if not left[current]:
+                del left[current]
+            return current, [(["extra_turns"], left)] + new_turn
+        nxt = self._next[current]
+        # anyone unseated is skipped; the dead are unlinked so they're only seen once
+        for _ in range(len(self._seat) + 1):
+            if nxt in self.seated and self._alive(nxt):
+                break
+            self.unseat(nxt)
+            nxt = self._next[nxt]
+        else:
+            # nobody left to hand the turn to
+            return current, []
+        return nxt, [(["current_turn_index"], self._seat[nxt])] + new_turn
+
+
+class EffectEngine:
+    """Timed status effects (buffs, traps, cooldowns) of one match.
+
+    Effects live in state["effects"] bucketed by the turn number they expire on,
+    {"<turn_no>": [effect, ...]}, so a turn boundary only touches the bucket that
+    expires then. An expired bucket is overwritten with None (patches can only set
+    values) and dropped from memory. Like occupancy, the in-memory indexes follow
+    the patches applied by GameManager.record, so journal replay rebuilds them.
+
+    An effect is a dict with "kind" and "player", plus "amount" for stat buffs
+    ("shield", "attack") and traps, and "tile" for traps."""
+    # stat buffs and the state field each one raises while active
+    BUFF_FIELDS = {"shield": "shield", "attack": "attack_bonus"}
+
+    def __init__(self, gm: "GameManager"):
+        self.gm = gm
+        # expiry turn -> effects
+        self.buckets: Dict[int, List[Dict[str, Any]]] = {}
+        # tile -> (expiry turn, trap effect)
+        self.traps: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+        # player_id -> turn their ability is usable again
+        self.cooldowns: Dict[str, int] = {}
+
+    def reset(self):
+        self.buckets, self.traps, self.cooldowns = {}, {}, {}
+        effects = self.gm.state.get("effects", {})
+        # expired buckets are only tombstones; nothing needs them once the state is loaded
+        for key in [key for key, bucket in effects.items() if bucket is None]:
+            del effects[key]
+        for key, bucket in effects.items():
+            self.on_patch(key, bucket)
+
+    def on_patch(self, key: str, effects: Optional[List[Dict[str, Any]]]):
+        """Keep the indexes in step with state["effects"][key] being set to effects."""
+        turn_no = int(key)
+        for effect in self.buckets.pop(turn_no, []):
+            if effect["kind"] == "trap" and self.traps.get(effect["tile"], (None,))[0] == turn_no:
+                del self.traps[effect["tile"]]
+            elif effect["kind"] == "cooldown" and self.cooldowns.get(effect["player"]) == turn_no:
+                del self.cooldowns[effect["player"]]
+        if not effects:
+            return
+        self.buckets[turn_no] = effects
+        for effect in effects:
+            if effect["kind"] == "trap":
+                self.traps[effect["tile"]] = (turn_no, effect)
+            elif effect["kind"] == "cooldown":
+                self.cooldowns[effect["player"]] = turn_no
+
+    def turn_no(self) -> int:
+        return self.gm.state.get("turn_no", 0)
+
+    def add(self, effects: List[Tuple[Dict[str, Any], int]]) -> List[Tuple[List[Any], Any]]:
+        """Patches starting each (effect, rounds) now and ending it after that many full
+        rounds of the table. Stat buffs are applied immediately and taken back on expiry.
+        Effects of one action must be added in one call, they may share a bucket."""
+        players = self.gm.state["players"]
+        round_len = max(1, len(self.gm.state.get("turn_order", [])))
+        buffed: Dict[Tuple[str, str], float] = {}
+        buckets: Dict[str, List[Dict[str, Any]]] = {}
+        for effect, rounds in effects:
+            expires = self.turn_no() + rounds * round_len
+            key = str(expires)
+            buckets.setdefault(key, list(self.buckets.get(expires, []))).append(effect)
+            field = self.BUFF_FIELDS.get(effect["kind"])
+            if field:
+                buff = (effect["player"], field)
+                buffed[buff] = buffed.get(buff, players[effect["player"]].get(field, 0)) + effect["amount"]
+        patches = [(["players", pid, field], value) for (pid, field), value in buffed.items()]
+        if "effects" not in self.gm.state:
+            patches.append((["effects"], buckets))
+        else:
+            patches.extend((["effects", key], bucket) for key, bucket in buckets.items())
+        return patches
+
+    def expire(self, turn_no: int) -> List[Tuple[List[Any], Any]]:
+        """Patches ending every effect due at turn_no: O(effects expiring now)."""
+        effects = self.buckets.get(turn_no)
+        if not effects:
+            return []
+        players = self.gm.state["players"]
+        # several buffs of one player may expire together: sum them before patching
+        restored: Dict[Tuple[str, str], float] = {}
+        for effect in effects:
+            field = self.BUFF_FIELDS.get(effect["kind"])
+            if field:
+                key = (effect["player"], field)
+                restored[key] = restored.get(key, players[effect["player"]].get(field, 0)) - effect["amount"]
+        patches = [(["players", pid, field], max(0, value)) for (pid, field), value in restored.items()]
+        patches.append((["effects", str(turn_no)], None))
+        return patches
+
+    def on_cooldown(self, player_id: str) -> bool:
+        return player_id in self.cooldowns
+
+    def trap_at(self, tile: int, player_id: str) -> Optional[Dict[str, Any]]:
+        """An opponent's trap on tile, if player_id would spring one by stopping there."""
+        found = self.traps.get(tile)
+        if found is None or found[1]["player"] == player_id:
+            return None
+        return found[1]
+
+    def spring_trap(self, tile: int) -> List[Tuple[List[Any], Any]]:
+        """Patches removing the trap on tile (it only goes off once)."""
+        turn_no, trap = self.traps[tile]
+        rest = [e for e in self.buckets[turn_no] if e is not trap]
+        return [(["effects", str(turn_no)], rest or None)]
+
 
 class GameManager:
     def __init__(self, board_size: int = 10, allow_shared_tiles: bool = True):
         self.board_size = board_size
-        # player_id -> Characters instance
-        self.players: Dict[str, Characters] = {}
+        # player_id -> shared read-only CharacterDef (per-player stats are in state)
+        self.players: Dict[str, CharacterDef] = {}
         # player_id -> (x,y)
         self.positions: Dict[str, Position] = {}
         # (x,y) -> set[player_id]  (fast occupancy check; supports shared tiles)
         self.occupancy: Dict[Position, set] = {}
-        self.lock = Lock()
+        # per-match lock: socket handlers hold it for a whole event, so it must be re-entrant
+        self.lock = RLock()
         # optional: store turn order
         self.turn_order: List[str] = []
         self.current_turn_index: int = 0
@@ -24,6 +244,27 @@ class GameManager:
         # whether multiple players can share the same tile
         self.allow_shared_tiles = allow_shared_tiles
 
+        # authoritative match document (players, turn order, board layout...).
+        # matches/match_<id>.json is only a write-behind checkpoint of this.
+        self.match_id: Optional[str] = None
+        self.path: Optional[str] = None
+        self.state: Dict[str, Any] = {}
+        # True while state has changes that haven't been checkpointed yet
+        self.dirty: bool = False
+        # sequence number of the last journaled event applied to state
+        self.seq: int = 0
+        self.payloads = PayloadCache()
+        # set once the lifecycle manager dropped this instance from active_games
+        self.evicted: bool = False
+        self.turns = TurnScheduler(self)
+        self.effects = EffectEngine(self)
+        # the match's own RNG (dice, turn order, board, spawn tiles). Re-seeded from
+        # state["rng_seed"] and seq after every event, so the draws of an event depend
+        # only on the seed and how far the match got: identical after a restart or replay.
+        self.rng = random.Random()
+        # compiled ladders/snakes of state["board_features"], shared with every match on the same layout
+        self.jumps = board.NO_JUMPS
+
     # ---------------------
     # helpers
     # ---------------------
@@ -59,14 +300,132 @@ class GameManager:
         cand = [(x+1,y),(x-1,y),(x,y+1),(x,y-1)]
         return [p for p in cand if self.in_bounds(p)]
 
+    def _random_tile(self) -> Position:
+        free = [(x,y) for x in range(self.board_size) for y in range(self.board_size)]
+        if not free:
+            raise RuntimeError("Board full")
+        return self.rng.choice(free)
+
+    def _random_free_tile(self) -> Position:
+        free_unocc = [(x,y) for x in range(self.board_size) for y in range(self.board_size) if not self.is_occupied((x,y))]
+        if not free_unocc:
+            raise RuntimeError("Board full (no free tiles)")
+        return self.rng.choice(free_unocc)
+
+    def board_hash(self) -> int:
+        """Hash of who stands where (order independent)."""
+        return hash(frozenset((pos, frozenset(s)) for pos, s in self.occupancy.items()))
+
     # Manhattan distance
     def manhattan(self, a: Position, b: Position) -> int:
         return abs(a[0]-b[0]) + abs(a[1]-b[1])
 
+    # ---------------------
+    # match state
+    # ---------------------
+    def load_state(self, match_id: str, path: str, state: Dict[str, Any]):
+        """Attach the match document this game owns from now on."""
+        self.match_id = match_id
+        self.path = path
+        self.state = state
+        self.dirty = False
+        self.seq = state.get("seq", 0)
+        self.turns.reset()
+        self.effects.reset()
+        self.jumps = board.compile_layout(state.get("board_features"))
+        self._reseed()
+
+    def _reseed(self):
+        seed = self.state.get("rng_seed")
+        # matches created before rng_seed existed keep an unseeded RNG
+        if seed is not None:
+            self.rng.seed("%d:%d" % (seed, self.seq))
+
+    @classmethod
+    def from_state(cls, match_id: str, path: str, state: Dict[str, Any], board_size: int = 10) -> "GameManager":
+        """Rebuild a game from a recovered match document (snapshot + journal replay)."""
+        gm = cls(board_size=board_size)
+        gm.load_state(match_id, path, state)
+        # turn_order only exists once players started joining; those are the spawned ones
+        for player_id in state.get("turn_order", []):
+            info = state["players"][player_id]
+            gm.spawn_player(player_id, CHARACTERS[info["id"]], tuple(info["position"]))
+        gm.turn_order = list(state.get("turn_order", []))
+        gm.current_turn_index = state.get("current_turn_index", 0)
+        return gm
+
+    def set_state(self, keys: List[Any], value: Any):
+        """Set a nested value in the match document, e.g. (["players", "3", "health"], 80)."""
+        obj = self.state
+        for key in keys[:-1]:
+            obj = obj[key]
+        obj[keys[-1]] = value
+        self.dirty = True
+
+    def encoded_state(self) -> bytes:
+        """The match document as compact JSON bytes for clients, encoded once per version.
+        SERVER_ONLY keys are left out: whoever knows rng_seed can predict every roll."""
+        with self.lock:
+            return self.payloads.get("snapshot", self.seq, lambda: json.dumps(
+                {k: v for k, v in self.state.items() if k not in SERVER_ONLY}, separators=(",", ":")).encode())
+
+    def attackable(self, player_id: str, char_range) -> List[str]:
+        """Living opponents of player_id inside char_range, using the precomputed range masks:
+        one AND of the attacker's tile mask against the opponents' tiles."""
+        players = self.state["players"]
+        origin = board.POS_TILE.get(tuple(players[player_id]["position"]))
+        if origin is None:
+            # still in spawn, nothing is in range
+            return []
+        reach = board.range_masks(char_range[0], char_range[1])[origin]
+        targets = []
+        for pid, info in players.items():
+            # the eliminated stay on their tile but aren't targets
+            if pid == player_id or info["health"] <= 0:
+                continue
+            tile = board.POS_TILE.get(tuple(info["position"]))
+            if tile is not None and reach >> tile & 1:
+                targets.append(pid)
+        return targets
+
+    def record(self, event: str, patches: List[Tuple[List[Any], Any]], **info) -> Dict[str, Any]:
+        """Apply one action's patches to the match document and return its journal entry.
+
+        Position patches also update occupancy, so replaying a journal rebuilds both."""
+        for keys, value in patches:
+            self.set_state(keys, value)
+            if len(keys) == 3 and keys[0] == "players" and keys[2] == "position":
+                self.move_player(keys[1], (value[0], value[1]))
+            elif keys == ["turn_order"]:
+                self.turns.reset()
+            elif keys == ["board_features"]:
+                self.jumps = board.compile_layout(value)
+            elif keys[0] == "effects":
+                if len(keys) == 2:
+                    self.effects.on_patch(keys[1], value)
+                else:
+                    self.effects.reset()
+        self.seq += 1
+        self.state["seq"] = self.seq
+        self._reseed()
+        entry = {"seq": self.seq, "ev": event}
+        entry.update(info)
+        entry["set"] = [[keys, value] for keys, value in patches]
+        return entry
+
+    def move_player(self, player_id: str, pos: Position):
+        """Update occupancy for a player moving to pos."""
+        with self.lock:
+            old = self.positions.get(player_id)
+            if old is not None:
+                self._remove_occupant(old, player_id)
+            self.positions[player_id] = tuple(pos)
+            self._add_occupant(tuple(pos), player_id)
+
     # ---------------------
     # player / spawn / remove
     # ---------------------
-    def spawn_player(self, player_id: str, char: Characters, pos: Optional[Position] = None) -> Position:
+    def spawn_player(self, player_id: str, char: CharacterDef, pos: Optional[Position] = None) -> Position:
         """Add a player to the game, optionally at a position. If pos None, pick random free tile (or any if shared allowed)."""
         with self.lock:
             if player_id in self.players:
@@ -74,19 +433,13 @@ class GameManager:
 
             # pick a free or random cell if not provided
             if pos is None:
-                free = [(x,y) for x in range(self.board_size) for y in range(self.board_size)]
-                if not free:
-                    raise RuntimeError("Board full")
-                pos = random.choice(free)
+                pos = self._random_tile()
 
             # if shared tiles aren't allowed, ensure not occupied
             if not self.allow_shared_tiles:
                 # find an unoccupied tile if requested pos is taken
                 if self.is_occupied(pos):
-                    free_unocc = [(x,y) for x in range(self.board_size) for y in range(self.board_size) if not self.is_occupied((x,y))]
-                    if not free_unocc:
-                        raise RuntimeError("Board full (no free tiles)")
-                    pos = random.choice(free_unocc)
+                    pos = self._random_free_tile()
 
             self.players[player_id] = char
             self.positions[player_id] = pos
@@ -102,9 +455,87 @@ class GameManager:
             if pos:
                 self._remove_occupant(pos, player_id)
             self.players.pop(player_id, None)
+            self.turns.unseat(player_id)
             if player_id in self.turn_order:
                 idx = self.turn_order.index(player_id)
                 self.turn_order.remove(player_id)
                 if idx <= self.current_turn_index and self.current_turn_index > 0:
                     self.current_turn_index -= 1
                 self.current_turn_index %= max(1, len(self.turn_order)) if self.turn_order else 0
+
+
+# neighbours of every on-board cell, same order as GameManager.neighbors
+_NEIGHBORS: Dict[Position, List[Position]] = {
+    pos: [p for p in ((pos[0]+1,pos[1]),(pos[0]-1,pos[1]),(pos[0],pos[1]+1),(pos[0],pos[1]-1)) if board.in_bounds(p)]
+    for pos in board.TILE_POS
+}
+
+
+class BitboardGameManager(GameManager):
+    """GameManager with occupancy also kept as a 100-bit mask over board tiles.
+
+    Same public methods (is_occupied, occupants, neighbors, spawn/move/remove);
+    free-tile sampling and board_hash are bit operations instead of full-board
+    list comprehensions, while per-cell checks keep using the plain dict
+    occupancy, which every position (the spawn square (-1, -1) included) is
+    still tracked in. Only the 10x10 board from board.py is supported.
+    """
+    def __init__(self, board_size: int = 10, allow_shared_tiles: bool = True):
+        if board_size != board.BOARD_SIZE:
+            raise ValueError("bitboard backend only supports the %dx%d board" % (board.BOARD_SIZE, board.BOARD_SIZE))
+        super().__init__(board_size, allow_shared_tiles)
+        # bit t set while at least one player stands on tile t
+        self.mask: int = 0
+        # player_id -> tile index
+        self.player_tiles: Dict[str, int] = {}
+        # xor of hash((player_id, tile)) over everyone on the board, updated incrementally
+        self._hash: int = 0
+
+    # is_occupied/occupants stay on the inherited occupancy dict: it only holds the
+    # handful of occupied cells, so a lookup beats shifting the 100-bit mask
+
+    def neighbors(self, pos: Position) -> List[Position]:
+        cached = _NEIGHBORS.get(pos)
+        return list(cached) if cached is not None else super().neighbors(pos)
+
+    def _add_occupant(self, pos: Position, player_id: str):
+        super()._add_occupant(pos, player_id)
+        tile = board.POS_TILE.get((pos[0], pos[1]))
+        if tile is None:
+            return
+        self.mask |= 1 << tile
+        self.player_tiles[player_id] = tile
+        self._hash ^= hash((player_id, tile))
+
+    def _remove_occupant(self, pos: Position, player_id: str):
+        super()._remove_occupant(pos, player_id)
+        tile = board.POS_TILE.get((pos[0], pos[1]))
+        if tile is None or self.player_tiles.get(player_id) != tile:
+            return
+        del self.player_tiles[player_id]
+        self._hash ^= hash((player_id, tile))
+        # shared tiles clear their bit only when the last player leaves
+        if (pos[0], pos[1]) not in self.occupancy:
+            self.mask &= ~(1 << tile)
+
+    def _random_tile(self) -> Position:
+        return board.TILE_POS[self.rng.randrange(board.TILE_COUNT)]
+
+    def _random_free_tile(self) -> Position:
+        free = ~self.mask & board.FULL_MASK
+        if not free:
+            raise RuntimeError("Board full (no free tiles)")
+        # with at most a handful of players the board is nearly empty, so a few
+        # random probes almost always hit a free tile
+        for _ in range(8):
+            tile = self.rng.randrange(board.TILE_COUNT)
+            if free >> tile & 1:
+                return board.TILE_POS[tile]
+        # crowded board: pick the k-th set bit of the free mask
+        k = self.rng.randrange(bin(free).count("1"))
+        for _ in range(k):
+            free &= free - 1
+        return board.TILE_POS[(free & -free).bit_length() - 1]
+
+    def board_hash(self) -> int:
+        return self._hash
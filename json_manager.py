@@ -1,100 +1,376 @@
-import json, datetime, random
+import json, datetime, random, os, tempfile, struct
+import board
 from models import House, HousePlayer, Player, User, db
-from classes.characters import Ditte, Tontar, Makdi, Mishu, Dholky, Beaster, Prepto, Ishada, Padupie
-
-characters = {
-    1: Ditte(),
-    2: Tontar(),
-    3: Makdi(),
-    4: Mishu(),
-    5: Dholky(),
-    6: Beaster(),
-    7: Prepto(),
-    8: Ishada(),
-    9: Padupie(),
-}
-
-def create_file(path, user_id, match_id):
+from classes.characters import CHARACTERS
+
+# character id -> read-only CharacterDef, shared by all matches
+characters = CHARACTERS
+# build the attack range tables for every character up front
+for _char in characters.values():
+    board.range_masks(*_char.range)
+
+def create_file(path, user_id, match_id, seed=None):
     data = {
         "match_id" : match_id,
-        "satrted_at" : datetime.datetime.utcnow().isoformat()
+        "satrted_at" : datetime.datetime.utcnow().isoformat(),
+        # every random draw of the match derives from this, see GameManager.rng
+        "rng_seed" : seed if seed is not None else random.SystemRandom().getrandbits(63),
     }
-    house = db.session.query(House.id).filter_by(created_by=user_id).first()
-    players = db.session.query(HousePlayer.player_id).filter_by(house_id=house[0]).all()
-    
+    # house, members, usernames and equipped characters in one round-trip
+    # (this used to be 2 + 2 * players queries)
+    rows = (
+        db.session.query(House.id, HousePlayer.player_id, User.username, Player.equipped_character)
+        .join(HousePlayer, HousePlayer.house_id == House.id)
+        .join(User, User.id == HousePlayer.player_id)
+        .outerjoin(Player, Player.user_id == HousePlayer.player_id)
+        .filter(House.created_by == user_id)
+        .all()
+    )
+
     data["players"] = {}
     i = 0
-    for player in players:
-        chosen_character = characters[db.session.query(Player.equipped_character).filter_by(user_id=player[0]).first()[0]]
-        user = db.session.query(User.username).filter_by(id=player[0]).first()
-        data["players"][player[0]] = {}
-        data["players"][player[0]]["user"] = user[0]
-        data["players"][player[0]]["id"] = chosen_character.id
-        data["players"][player[0]]["name"] = chosen_character.name
-        data["players"][player[0]]["max_health"] = chosen_character.health
-        data["players"][player[0]]["health"] = chosen_character.health
-        data["players"][player[0]]["shield"] = chosen_character.shield
-        data["players"][player[0]]["dice_id"] = 1
-        data["players"][player[0]]["position"] = [0,0]
+    for house_id, player_id, username, equipped_character in rows:
+        chosen_character = characters[equipped_character or 1]
+        pid = str(player_id)
+        data["house_id"] = house_id
+        data["players"][pid] = {}
+        data["players"][pid]["user"] = username
+        data["players"][pid]["id"] = chosen_character.id
+        data["players"][pid]["name"] = chosen_character.name
+        data["players"][pid]["max_health"] = chosen_character.health
+        data["players"][pid]["health"] = chosen_character.health
+        data["players"][pid]["shield"] = chosen_character.shield
+        data["players"][pid]["dice_id"] = 1
+        data["players"][pid]["position"] = [0,0]
         i += 1
 
     data["player_count"] = i
     print(data)
 
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
+    write_snapshot(path, data)
+    return data
 
 def read_json(path):
     with open(path, "r") as f:
         return json.load(f)
 
-def add_pos(path, user_id, pos):
-    data = read_json(path)
-    
-    data["players"][str(user_id)]["position"] = pos
+def _atomic_write(path, payload):
+    """Write payload (bytes) to a temp file next to path, then rename over it,
+    so a crash never leaves a half-written match file behind."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
 
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
+def write_json(path, data):
+    _atomic_write(path, json.dumps(data, indent=2).encode())
 
-def gen_turn_order(path):
-    with open(path, "r") as f:
-        data =  json.load(f)
+# ---------------------
+# snapshot codecs
+# ---------------------
+class JsonCodec:
+    """Compact JSON, also reads the old pretty-printed match files."""
+    name = "json"
+    ext = ".json"
+
+    def dumps(self, data):
+        return json.dumps(data, separators=(",", ":")).encode()
+
+    def loads(self, payload):
+        return json.loads(payload)
+
+
+class BinaryCodec:
+    """struct-packed match snapshot.
+
+    Layout (little endian):
+      header   b"NHM2", seq:I, current_turn_index:B, player_count:B, n_players:B
+      player   id, user, name (H-length utf8), char id:B, max_health:H,
+               health:d, shield:d, dice_id:B, position:bb, extra (H-length json)
+      turns    count:B + one player slot:B per entry
+      board    flag:B, then 100 cells packed 4 per byte (colours are 0-3)
+      extra    I-length compact json with every other top level key
+    """
+    name = "binary"
+    ext = ".nhm"
+    MAGIC = b"NHM2"
+    # NHM1 files (B-length strings, which a long multi-byte username overflowed) still load
+    MAGICS = {b"NHM1": "<B", b"NHM2": "<H"}
+    PLAYER_KEYS = ("user", "id", "name", "max_health", "health", "shield", "dice_id", "position")
+    TOP_KEYS = ("players", "turn_order", "current_turn_index", "player_count", "board_layout", "seq")
+
+    @staticmethod
+    def _str(value):
+        raw = str(value).encode()
+        return struct.pack("<H", len(raw)) + raw
+
+    @staticmethod
+    def _num(value):
+        return int(value) if float(value).is_integer() else value
+
+    def dumps(self, data):
+        players = data.get("players", {})
+        slots = {pid: i for i, pid in enumerate(players)}
+        out = [self.MAGIC, struct.pack("<IBBB", data.get("seq", 0), data.get("current_turn_index", 0), data.get("player_count", len(players)), len(players))]
+        for pid, info in players.items():
+            extra = {k: v for k, v in info.items() if k not in self.PLAYER_KEYS}
+            extra_raw = json.dumps(extra, separators=(",", ":")).encode() if extra else b""
+            out.append(self._str(pid) + self._str(info["user"]) + self._str(info["name"]))
+            out.append(struct.pack("<BHddBbbH", info["id"], info["max_health"], info["health"], info["shield"], info["dice_id"], info["position"][0], info["position"][1], len(extra_raw)))
+            out.append(extra_raw)
+        turn_order = data.get("turn_order")
+        if turn_order is None:
+            out.append(struct.pack("<B", 255))
+        else:
+            out.append(struct.pack("<B", len(turn_order)) + bytes(slots[pid] for pid in turn_order))
+        board = data.get("board_layout")
+        if board is None:
+            out.append(struct.pack("<B", 0))
+        else:
+            cells = [cell for row in board for cell in row]
+            packed = bytes(cells[i] | cells[i+1] << 2 | cells[i+2] << 4 | cells[i+3] << 6 for i in range(0, len(cells), 4))
+            out.append(struct.pack("<B", 1) + packed)
+        extra = {k: v for k, v in data.items() if k not in self.TOP_KEYS}
+        extra_raw = json.dumps(extra, separators=(",", ":")).encode()
+        out.append(struct.pack("<I", len(extra_raw)) + extra_raw)
+        return b"".join(out)
+
+    def loads(self, payload):
+        buf = memoryview(payload)
+        str_len = self.MAGICS.get(bytes(buf[:4]))
+        if str_len is None:
+            raise ValueError("not a binary match snapshot")
+        str_len_size = struct.calcsize(str_len)
+        off = 4
+        seq, turn_index, player_count, n_players = struct.unpack_from("<IBBB", buf, off)
+        off += struct.calcsize("<IBBB")
+
+        def read_str():
+            nonlocal off
+            (n,) = struct.unpack_from(str_len, buf, off)
+            off += str_len_size
+            value = bytes(buf[off:off+n]).decode()
+            off += n
+            return value
+
+        players = {}
+        pids = []
+        fmt = "<BHddBbbH"
+        for _ in range(n_players):
+            pid, user, name = read_str(), read_str(), read_str()
+            char_id, max_health, health, shield, dice_id, x, y, extra_len = struct.unpack_from(fmt, buf, off)
+            off += struct.calcsize(fmt)
+            players[pid] = {
+                "user": user,
+                "id": char_id,
+                "name": name,
+                "max_health": max_health,
+                "health": self._num(health),
+                "shield": self._num(shield),
+                "dice_id": dice_id,
+                "position": [x, y],
+            }
+            if extra_len:
+                players[pid].update(json.loads(bytes(buf[off:off+extra_len])))
+                off += extra_len
+            pids.append(pid)
+
+        data = {}
+        n_turns = buf[off]
+        off += 1
+        turn_order = None
+        if n_turns != 255:
+            turn_order = [pids[slot] for slot in buf[off:off+n_turns]]
+            off += n_turns
+        board = None
+        if buf[off]:
+            packed = buf[off+1:off+26]
+            cells = [(byte >> shift) & 3 for byte in packed for shift in (0, 2, 4, 6)]
+            board = [cells[r*10:(r+1)*10] for r in range(10)]
+            off += 25
+        off += 1
+        (extra_len,) = struct.unpack_from("<I", buf, off)
+        off += 4
+        data.update(json.loads(bytes(buf[off:off+extra_len])))
+
+        data["players"] = players
+        data["player_count"] = player_count
+        if turn_order is not None:
+            data["turn_order"] = turn_order
+            data["current_turn_index"] = turn_index
+        if board is not None:
+            data["board_layout"] = board
+        if seq:
+            data["seq"] = seq
+        return data
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), BinaryCodec())}
+SNAPSHOT_CODEC = CODECS[os.getenv("MATCH_SNAPSHOT_CODEC", "binary")]
 
+def snapshot_path(path, codec=None):
+    """matches/match_<id>.json is the match's base path; the codec picks the extension."""
+    return os.path.splitext(path)[0] + (codec or SNAPSHOT_CODEC).ext
+
+def write_snapshot(path, data, codec=None):
+    codec = codec or SNAPSHOT_CODEC
+    _atomic_write(snapshot_path(path, codec), codec.dumps(data))
+
+def read_snapshot(path):
+    """Load the newest snapshot of a match, whichever codec wrote it.
+    Old pretty-printed .json matches load transparently."""
+    candidates = []
+    for codec in CODECS.values():
+        candidate = snapshot_path(path, codec)
+        try:
+            candidates.append((os.path.getmtime(candidate), candidate))
+        except OSError:
+            pass
+    if not candidates:
+        raise FileNotFoundError(path)
+    with open(max(candidates)[1], "rb") as f:
+        payload = f.read()
+    if payload[:4] in BinaryCodec.MAGICS:
+        return CODECS["binary"].loads(payload)
+    return CODECS["json"].loads(payload)
+
+def apply_patches(data, patches):
+    """Apply a list of (path, value) patches, e.g. [(["players", "3", "health"], 80), ...]."""
+    for keys, value in patches:
+        obj = data
+        for key in keys[:-1]:
+            obj = obj[key]
+        obj[keys[-1]] = value
+    return data
+
+def checkpoint(gm):
+    """Write-behind flush of an in-memory match (GameManager) to its snapshot file.
+    Only touches the disk when the state changed since the last checkpoint.
+
+    The snapshot then covers every journaled entry (record appends under the same lock),
+    so the journal is emptied: recovery reads one snapshot plus the entries since the last
+    checkpoint, and disk use doesn't grow with the match. Nothing is fsynced: this survives
+    the server process dying at any point, not the machine losing power."""
+    # held across the write so an older snapshot can never be renamed over a newer one
+    with gm.lock:
+        if not gm.dirty or not gm.path:
+            return False
+        write_snapshot(gm.path, gm.state)
+        # only after the rename: a crash in between leaves entries recover_state skips by seq
+        open(journal_path(gm.path), "w").close()
+        gm.dirty = False
+    return True
+
+def journal_path(path):
+    return os.path.splitext(path)[0] + ".journal"
+
+def record(gm, event, patches, **info):
+    """Apply one action to an in-memory match and append it to the match journal.
+
+    Each entry is one compact line ({"seq", "ev", ..., "set": [[path, value], ...]}),
+    so the journal alone is enough to roll a stale snapshot forward."""
+    with gm.lock:
+        entry = gm.record(event, patches, **info)
+        with open(journal_path(gm.path), "a") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    return entry
+
+def read_journal(path, after_seq=0):
+    entries = []
+    try:
+        with open(journal_path(path), "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # torn last line from a crash mid-append
+                    break
+                if entry["seq"] > after_seq:
+                    entries.append(entry)
+    except FileNotFoundError:
+        pass
+    return entries
+
+def recover_state(path):
+    """Load the last snapshot of a match and replay the journal tail written after it."""
+    data = read_snapshot(path)
+    for entry in read_journal(path, data.get("seq", 0)):
+        apply_patches(data, entry["set"])
+        data["seq"] = entry["seq"]
+    return data
+
+def remove_match_files(path):
+    """Delete every hot file of a match (snapshots in any codec and the journal)."""
+    for name in [snapshot_path(path, codec) for codec in CODECS.values()] + [journal_path(path)]:
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+
+# ---------------------
+# live match index
+# ---------------------
+def live_index_path(data_dir):
+    return os.path.join(data_dir, "index.json")
+
+def save_live_index(data_dir, match_ids):
+    _atomic_write(live_index_path(data_dir), json.dumps(sorted(match_ids)).encode())
+
+def load_live_index(data_dir):
+    """Ids of matches still in play, so a restart never has to scan the matches directory.
+    The first run without an index builds it once from the matches that have a journal,
+    plus snapshot-only matches from before the journal that were started and not finished."""
+    try:
+        return set(read_json(live_index_path(data_dir)))
+    except FileNotFoundError:
+        pass
+    match_ids = set()
+    snapshots = set()
+    exts = {codec.ext for codec in CODECS.values()}
+    for name in os.listdir(data_dir):
+        stem, ext = os.path.splitext(name)
+        if not stem.startswith("match_"):
+            continue
+        if ext == ".journal":
+            match_ids.add(stem[len("match_"):])
+        elif ext in exts:
+            snapshots.add(stem)
+    for stem in snapshots:
+        match_id = stem[len("match_"):]
+        if match_id in match_ids:
+            continue
+        try:
+            data = read_snapshot(os.path.join(data_dir, stem + ".json"))
+        except (OSError, ValueError, KeyError, struct.error):
+            continue
+        if data.get("turn_order") and not data.get("finished"):
+            match_ids.add(match_id)
+    save_live_index(data_dir, match_ids)
+    return match_ids
+
+def gen_turn_order(data, rng=random):
     turn = []
     for player in data["players"]:
         turn.append(player)
 
-    random.shuffle(turn)
-    data["turn_order"] = turn
-    data["current_turn_index"] = 0
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
+    rng.shuffle(turn)
 
     return turn
 
-def modify_json(path, el_to_modify, new_val):
-    data = read_json(path)
-    
-    obj = data
-    for key in el_to_modify[:-1]:
-        obj = obj[key]
-
-    obj[el_to_modify[-1]] = new_val
-
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
-
-def create_board(path):
+def create_board(rng=random):
     board_cells =  []
 
     for i in range(10):
         row = []
         for j in range(10):
-            cell = random.randint(0, 3)
+            cell = rng.randint(0, 3)
             row.append(cell)
         board_cells.append(row)
         
     print(board_cells)
-    modify_json(path, ["board_layout"], board_cells)
 
     return board_cells
\ No newline at end of file
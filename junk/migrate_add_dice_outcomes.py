@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the outcomes column to the dice table and fill in the built-in outcome tables.
+"""
+
+import sys
+import os
+from sqlalchemy import text, inspect
+from sqlalchemy.exc import ProgrammingError
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db, Dice
+from classes.dice import DEFAULT_OUTCOMES, WeightedDice
+
+def migrate_database():
+    """Add outcomes column and fill it for the dice that shipped with hardcoded classes"""
+    with app.app_context():
+        inspector = inspect(db.engine)
+
+        try:
+            # Check if outcomes column exists in dice table
+            dice_columns = [col['name'] for col in inspector.get_columns('dice')]
+            if 'outcomes' not in dice_columns:
+                print("Adding 'outcomes' column to 'dice' table...")
+                db.session.execute(text("ALTER TABLE dice ADD COLUMN outcomes JSON"))
+                db.session.commit()
+                print("✓ Added 'outcomes' column to 'dice' table")
+            else:
+                print("✓ 'outcomes' column already exists in 'dice' table")
+
+            # Fill outcomes for the built-in dice, leaving tables someone already edited alone
+            print("\nUpdating dice outcomes...")
+            for dice_name, outcomes in DEFAULT_OUTCOMES.items():
+                dice = Dice.query.filter_by(name=dice_name).first()
+                if dice:
+                    if not dice.outcomes:
+                        dice.outcomes = outcomes
+                        print(f"✓ Set {dice_name} outcomes ({len(outcomes)} outcomes)")
+                    else:
+                        print(f"✓ {dice_name} already has outcomes")
+                else:
+                    print(f"⚠ Dice '{dice_name}' not found in database")
+
+            # Every table must be usable before the server loads it
+            for dice in Dice.query.all():
+                if dice.outcomes:
+                    WeightedDice(dice.id, dice.name, dice.outcomes)
+
+            # Commit all changes
+            db.session.commit()
+            print("\n✓ Migration completed successfully!")
+
+        except ProgrammingError as e:
+            db.session.rollback()
+            print(f"\n✗ Database error: {e}")
+            print("Rolling back changes...")
+            sys.exit(1)
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n✗ Unexpected error: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
+
+if __name__ == '__main__':
+    migrate_database()
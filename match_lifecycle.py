@@ -0,0 +1,78 @@
+# match_lifecycle.py
+# Decides when a match is over, when it can leave memory and when it is abandoned.
+# The side effects (archiving to the DB, deleting files, socket events) live in app.py.
+import time
+from collections import OrderedDict
+from threading import Lock
+import board
+
+
+def match_result(state):
+    """(finished, winner_id) for a match document.
+    A match is over when someone reaches the last tile or only one player is left alive.
+    Once end_turn has recorded the result ("finished"/"winner") that stays the answer."""
+    if state.get("finished"):
+        return True, state.get("winner")
+    players = state.get("players", {})
+    # nothing is decided before the first player joins (turn order is set on join)
+    if "turn_order" not in state or len(players) < 2:
+        return False, None
+    for player_id, info in players.items():
+        pos = info["position"]
+        if info["health"] > 0 and board.in_bounds(pos) and board.tile_of(pos) == board.LAST_TILE:
+            return True, player_id
+    alive = [player_id for player_id, info in players.items() if info["health"] > 0]
+    if len(alive) <= 1:
+        return True, alive[0] if alive else None
+    return False, None
+
+
+def match_result_after(state, patches):
+    """match_result of state as it will be once patches are applied, without applying them."""
+    players = {pid: dict(info) for pid, info in state.get("players", {}).items()}
+    for keys, value in patches:
+        if keys[0] != "players":
+            continue
+        if len(keys) == 2:
+            players[keys[1]] = value
+        elif len(keys) == 3 and keys[1] in players:
+            players[keys[1]][keys[2]] = value
+    return match_result(dict(state, players=players))
+
+
+class MatchLifecycle:
+    def __init__(self, idle_ttl: float, abandon_ttl: float, max_resident: int):
+        # resident matches untouched for idle_ttl seconds are flushed and dropped from memory
+        self.idle_ttl = idle_ttl
+        # live matches untouched for abandon_ttl seconds are archived and removed from disk
+        self.abandon_ttl = abandon_ttl
+        # LRU cap on matches held in memory at once
+        self.max_resident = max_resident
+        # match_id -> last activity (monotonic), least recently used first
+        self.last_active: "OrderedDict[str, float]" = OrderedDict()
+        self.lock = Lock()
+
+    def touch(self, match_id: str):
+        with self.lock:
+            self.last_active[match_id] = time.monotonic()
+            self.last_active.move_to_end(match_id)
+
+    def forget(self, match_id: str):
+        with self.lock:
+            self.last_active.pop(match_id, None)
+
+    def plan(self, resident):
+        """Returns (to_evict, to_abandon) given the ids currently held in memory."""
+        now = time.monotonic()
+        to_evict, to_abandon = [], []
+        with self.lock:
+            overflow = len(resident) - self.max_resident
+            # oldest first, so the first overflow resident matches are the least recently used
+            for match_id, ts in self.last_active.items():
+                idle = now - ts
+                if idle > self.abandon_ttl:
+                    to_abandon.append(match_id)
+                elif match_id in resident and (idle > self.idle_ttl or overflow > 0):
+                    to_evict.append(match_id)
+                    overflow -= 1
+        return to_evict, to_abandon
@@ -345,6 +345,8 @@ class Dice(db.Model):
     rarity = db.Column(db.String(20), nullable=False)  # Common, Rare, Epic, Legendary
     image_path = db.Column(db.String(255), nullable=True)
     price = db.Column(db.Integer, nullable=True)  # Price in coins
+    # weighted outcome table, see classes.dice.WeightedDice; NULL uses the built-in table for name
+    outcomes = db.Column(db.JSON, nullable=True)
     
     def __repr__(self):
         return f'<Dice {self.name}>'
@@ -433,6 +435,7 @@ class House(db.Model):
     finished_at = db.Column(db.DateTime, nullable=True)
     
     players = db.relationship('HousePlayer', backref='house', lazy=True, cascade='all, delete-orphan')
+    games = db.relationship('Game', backref='house', lazy=True, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<House {self.house_code}>'
@@ -466,7 +469,6 @@ class Game(db.Model):
     finished_at = db.Column(db.DateTime, nullable=True)
     game_data = db.Column(db.JSON, nullable=True)  # Store game state/log
     
-    house = db.relationship('House', backref='games')
     winner = db.relationship('Player', backref='won_games')
     
     def __repr__(self):
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Headless match simulator for balance testing.
+
+Plays complete matches between policy bots with the real character stats and
+dice classes, the live movement rules (spawn until a 1 or 6, snake path up to
+tile 99, last tile or last one standing wins) and combat.py for targeting and
+damage. Batches run across a process pool; each worker returns mergeable
+counters, so millions of games only ship a few small dicts between processes.
+
+    python simulator.py --games 100000 --players 4 --policy aggressor --workers 8
+"""
+import argparse, random, time
+from collections import Counter, defaultdict
+from multiprocessing import Pool
+
+import numpy as np
+
+import board
+from combat import CombatState, OFF_BOARD
+from classes.characters import CHARACTERS
+from classes.dice import DEFAULT_DICE, RollPool
+
+# the built-in tables; the simulator runs without a database
+DICE = DEFAULT_DICE
+# games still undecided after this many turns count as draws
+MAX_TURNS = 400
+# width of the damage-dealt histogram buckets
+DAMAGE_BUCKET = 25
+
+
+class Match:
+    """One simulated match: the combat arrays plus whose turn it is."""
+    def __init__(self, lineup, rng, pool):
+        # lineup: [(character_id, dice_id), ...] in seat order
+        self.rng = rng
+        # dice rolls come from pre-drawn buffers instead of one randint call each
+        self.pool = pool
+        chars = [CHARACTERS[c] for c, _ in lineup]
+        self.lineup = list(lineup)
+        self.dice = [DICE[d] for _, d in lineup]
+        self.fight = CombatState(
+            [str(i) for i in range(len(lineup))],
+            [OFF_BOARD] * len(lineup),
+            [c.health for c in chars],
+            [c.shield for c in chars],
+            [c.attack for c in chars],
+            [c.range[0] for c in chars],
+            [c.range[1] for c in chars],
+        )
+        self.damage_dealt = np.zeros(len(lineup))
+        self.turns = 0
+
+    def targets(self, me):
+        return np.flatnonzero(self.fight.in_range(me) & self.fight.alive())
+
+    def roll(self, me):
+        """Roll and move me forward along the path. Returns whether the dice granted an extra turn."""
+        outcome = self.dice[me].roll_outcome(self.pool)
+        value, extra_turn = outcome["value"], outcome["extra_turn"]
+        if outcome["backfire"]:
+            # cursed dice hurt the roller, shield or not
+            hit = np.zeros(len(self.lineup), dtype=bool)
+            hit[me] = True
+            self.fight.hit(hit, outcome["backfire"], pierce=True)
+            if self.fight.health[me] <= 0:
+                return False
+        tile = int(self.fight.tiles[me])
+        if tile == OFF_BOARD:
+            if value in (1, 6):
+                self.fight.move(me, 0)
+        else:
+            self.fight.move(me, min(tile + value, board.LAST_TILE))
+        return extra_turn
+
+    def attack(self, me, target):
+        hit = np.zeros(len(self.lineup), dtype=bool)
+        hit[target] = True
+        self.damage_dealt[me] += self.fight.attack_players(me, hit).sum()
+
+    def winner_after(self, me, target):
+        """Seat of the winner once me rolled (target None) or attacked target, -1 while undecided.
+        Only me can have reached the last tile, and only the player just hit (by an attack, or
+        me by a backfiring roll) can have left one player standing."""
+        if target is None:
+            if self.fight.health[me] > 0:
+                return me if self.fight.tiles[me] == board.LAST_TILE else -1
+            target = me
+        if self.fight.health[target] > 0:
+            return -1
+        alive = np.flatnonzero(self.fight.alive())
+        return int(alive[0]) if len(alive) == 1 else -1
+
+
+# ---------------------
+# policies: (match, seat) -> target seat to attack, or None to roll
+# ---------------------
+def racer(match, me):
+    return None
+
+
+def aggressor(match, me):
+    targets = match.targets(me)
+    if not len(targets):
+        return None
+    return int(targets[np.argmin(match.fight.health[targets])])
+
+
+def balanced(match, me):
+    """Attack whoever is closer to the last tile, or a target this hit would finish; otherwise run."""
+    targets = match.targets(me)
+    if not len(targets):
+        return None
+    fight = match.fight
+    ahead = targets[fight.tiles[targets] > fight.tiles[me]]
+    killable = targets[fight.health[targets] <= fight.attack[me] * (1 - fight.shield[targets] / 100)]
+    if len(killable):
+        return int(killable[0])
+    if len(ahead):
+        return int(ahead[np.argmax(fight.tiles[ahead])])
+    return None
+
+
+POLICIES = {"racer": racer, "aggressor": aggressor, "balanced": balanced}
+
+
+def play(lineup, policies, rng, pool):
+    """Run one match to the end. Returns (winner seat or -1, turns, damage dealt per seat)."""
+    match = Match(lineup, rng, pool)
+    order = list(range(len(lineup)))
+    rng.shuffle(order)
+    seat = 0
+    while match.turns < MAX_TURNS:
+        me = order[seat]
+        match.turns += 1
+        target = policies[me](match, me)
+        extra_turn = False
+        if target is None:
+            extra_turn = match.roll(me)
+        else:
+            match.attack(me, target)
+        winner = match.winner_after(me, target)
+        if winner >= 0:
+            return winner, match.turns, match.damage_dealt
+        if extra_turn:
+            continue
+        # hand the turn on, skipping the eliminated
+        for _ in order:
+            seat = (seat + 1) % len(order)
+            if match.fight.health[order[seat]] > 0:
+                break
+    return -1, match.turns, match.damage_dealt
+
+
+class Stats:
+    """Per (character, dice) counters; merge() combines the results of separate workers."""
+    def __init__(self):
+        self.games = Counter()
+        self.wins = Counter()
+        self.turns = Counter()
+        self.matches = 0
+        self.draws = 0
+        # combo -> Counter of damage-dealt buckets
+        self.damage = defaultdict(Counter)
+
+    def add(self, lineup, winner, turns, damage_dealt):
+        self.matches += 1
+        if winner < 0:
+            self.draws += 1
+        for seat, combo in enumerate(lineup):
+            self.games[combo] += 1
+            self.turns[combo] += turns
+            self.damage[combo][int(damage_dealt[seat] // DAMAGE_BUCKET)] += 1
+            if seat == winner:
+                self.wins[combo] += 1
+
+    def merge(self, other: "Stats"):
+        self.games.update(other.games)
+        self.wins.update(other.wins)
+        self.turns.update(other.turns)
+        self.matches += other.matches
+        self.draws += other.draws
+        for combo, hist in other.damage.items():
+            self.damage[combo].update(hist)
+        return self
+
+    def damage_percentile(self, combo, q):
+        """Lower bound of the damage bucket holding the q-th quantile, so a combo
+        that never dealt DAMAGE_BUCKET damage reports 0."""
+        hist = self.damage[combo]
+        need = q * sum(hist.values())
+        seen = 0
+        for bucket in sorted(hist):
+            seen += hist[bucket]
+            if seen >= need:
+                return bucket * DAMAGE_BUCKET
+        return 0
+
+    def report(self):
+        lines = ["%-10s %-18s %8s %7s %7s %7s %7s" % ("character", "dice", "games", "win%", "turns", "dmg50", "dmg90")]
+        rows = sorted(self.games, key=lambda combo: -self.wins[combo] / self.games[combo])
+        for combo in rows:
+            char_id, dice_id = combo
+            games = self.games[combo]
+            lines.append("%-10s %-18s %8d %6.1f%% %7.1f %7d %7d" % (
+                CHARACTERS[char_id].name, DICE[dice_id].name, games,
+                100 * self.wins[combo] / games, self.turns[combo] / games,
+                self.damage_percentile(combo, 0.5), self.damage_percentile(combo, 0.9)))
+        lines.append("%d matches, %d draws" % (self.matches, self.draws))
+        return "\n".join(lines)
+
+
+def run_batch(args):
+    """Worker entry point: play n games with random lineups from a seeded RNG.
+    The same job always plays out the same games."""
+    seed, n, players, policy_names, char_ids, dice_ids = args
+    rng = random.Random(seed)
+    pool = RollPool(rng.getrandbits(64))
+    stats = Stats()
+    policies = [POLICIES[name] for name in policy_names]
+    for _ in range(n):
+        lineup = [(rng.choice(char_ids), rng.choice(dice_ids)) for _ in range(players)]
+        stats.add(lineup, *play(lineup, policies, rng, pool))
+    return stats
+
+
+def simulate(games, players=4, policies=("balanced",), workers=None, seed=0, batch=2000,
+             char_ids=None, dice_ids=None):
+    """Play games matches across a process pool and return the merged Stats."""
+    char_ids = list(char_ids or CHARACTERS)
+    dice_ids = list(dice_ids or DICE)
+    # one policy per seat; a single name is used for everyone
+    seat_policies = [policies[i % len(policies)] for i in range(players)]
+    jobs = []
+    for i, start in enumerate(range(0, games, batch)):
+        jobs.append((seed * 1000003 + i, min(batch, games - start), players, seat_policies, char_ids, dice_ids))
+    stats = Stats()
+    with Pool(workers) as pool:
+        for part in pool.imap_unordered(run_batch, jobs):
+            stats.merge(part)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--policy", action="append", choices=sorted(POLICIES),
+                        help="policy per seat, repeat for mixed tables (default: balanced)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--characters", type=int, nargs="*", help="character ids to draw from")
+    parser.add_argument("--dice", type=int, nargs="*", help="dice ids to draw from")
+    opts = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = simulate(opts.games, opts.players, opts.policy or ["balanced"], opts.workers, opts.seed,
+                     opts.batch, opts.characters, opts.dice)
+    print(stats.report())
+    print("%d games in %.1fs" % (opts.games, time.perf_counter() - started))
+
+
+if __name__ == "__main__":
+    main()
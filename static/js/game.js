@@ -6,6 +6,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const playerId = String(authUserId || "");
     const socket = io();
     let currentSnapshot = null; // latest snapshot from server
+    let currentVersion = 0; // journal seq the snapshot is at; match_delta must be currentVersion + 1
     let highlightedSet = new Set(); // set of 'x,y' strings for valid move targets
 
     // ===== Flash Message System =====
@@ -109,12 +110,32 @@ document.addEventListener('DOMContentLoaded', () => {
     socket.on('error', (err) => console.error('[SOCKET] error', err));
 
     socket.on('match_snapshot', (snap) => {
+        // server sends the snapshot pre-encoded (JSON bytes) so it is serialized once per version
+        if (snap instanceof ArrayBuffer) snap = JSON.parse(new TextDecoder().decode(snap));
         // render players on the grid (function defined below)
         console.log('match_snapshot', snap);
         currentSnapshot = snap;
+        currentVersion = snap.seq || 0;
         renderSnapshot(snap);
     });
 
+    // Only the changed fields after each action: [[path, value], ...]
+    socket.on('match_delta', (d) => {
+        if (!d || d.version <= currentVersion) return; // already have it
+        if (!currentSnapshot || d.version !== currentVersion + 1) {
+            // missed an update, ask for the full state again
+            socket.emit('resync_request', { match_id: matchId, player_id: playerId });
+            return;
+        }
+        d.set.forEach(([keys, value]) => {
+            let obj = currentSnapshot;
+            for (let i = 0; i < keys.length - 1; i++) obj = obj[keys[i]];
+            obj[keys[keys.length - 1]] = value;
+        });
+        currentSnapshot.seq = currentVersion = d.version;
+        if (d.set.length) renderSnapshot(currentSnapshot);
+    });
+
     // --------------------------
     // Roll + Move UI wiring
     // --------------------------
@@ -175,14 +196,57 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
-    // Ability button (new, do nothing for now)
+    // Ability button: the server picks the target for targeted abilities and ends the turn
     if (abilityBtn) {
         abilityBtn.addEventListener('click', () => {
-            // TODO: Implement ability functionality
-            console.log('Ability button clicked');
+            if (!matchId || !playerId) {
+                showFlashMessage('Missing match or player ID. Cannot use ability.');
+                return;
+            }
+            abilityBtn.disabled = true;
+            socket.emit('ability_request', { match_id: matchId, player_id: playerId });
         });
     }
 
+    socket.on('move_failed', (d) => {
+        const reasons = {
+            no_roll: 'You must roll first!',
+            invalid_move: 'Move out of bounds',
+        };
+        showFlashMessage(reasons[d && d.reason] || 'Move failed');
+    });
+
+    socket.on('ability_result', (d) => {
+        showFlashMessage(`${d.user} uses ${d.ability}!`);
+    });
+
+    socket.on('autopilot', (d) => {
+        showFlashMessage(d.active ? 'A player disconnected, autopilot plays their turns' : 'A player is back in control');
+    });
+
+    socket.on('ability_failed', (d) => {
+        const reasons = {
+            cooldown: 'Ability is recharging',
+            no_target: 'Nobody in range',
+            in_spawn: 'Enter the board first',
+            no_room: 'No room to move',
+            not_your_turn: 'Not your turn',
+            already_rolled: 'You already rolled, move first',
+        };
+        showFlashMessage(reasons[d.reason] || 'Ability failed');
+        if (abilityBtn) abilityBtn.disabled = false;
+    });
+
+    socket.on('attack_failed', (d) => {
+        const reasons = {
+            not_your_turn: 'Not your turn',
+            already_rolled: 'You already rolled, move first',
+        };
+        showFlashMessage(reasons[d && d.reason] || 'Attack failed');
+        attackMode = false;
+        if (attackBtn) attackBtn.disabled = false;
+    });
+
     socket.on('turn_update', (d) => {
         // Clear any pending timeout when turn changes
         if (rollDisplayTimeout) {
@@ -217,6 +281,23 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    socket.on('game_over', (d) => {
+        rollBtn.disabled = true;
+        attackBtn.disabled = true;
+        itemsBtn.disabled = true;
+        abilityBtn.disabled = true;
+        if (gameActionButtons) {
+            gameActionButtons.classList.add('hidden');
+        }
+        const message = !d.winner ? "Game over: nobody won" : (d.winner === playerId ? "You won!" : `${d.user} won!`);
+        turnIndicator.textContent = message;
+        showFlashMessage(message, 5000);
+        // back to the house once the result has been seen
+        setTimeout(() => {
+            window.location.href = window.CREATE_HOUSE_URL || "/create_house";
+        }, 5000);
+    });
+
     socket.on('health_update', (d) => {
         console.log(d)
         // Zoom out whenever ANY player attacks (health update indicates an attack happened)
@@ -240,7 +321,7 @@ document.addEventListener('DOMContentLoaded', () => {
     socket.on('attackable_players_result', (d) => {
         if (d.player_id === playerId){
             if (d.success === false){
-                showFlashMessage("No Players in range")
+                showFlashMessage(d.reason ? "You can't attack now" : "No Players in range")
                 attackMode = false;
             }
             highlightPositions(d.attacks)
@@ -275,6 +356,10 @@ document.addEventListener('DOMContentLoaded', () => {
             }, 2500);
         }
 
+        if (d.backfire) {
+            showFlashMessage(`${d.user || 'Player'}'s cursed dice backfired for ${d.backfire} damage!`);
+        }
+
         // If this roll is not for us, do not enable movement
         if (!rollerId || String(rollerId) !== playerId) {
             // Prevent local click actions for non-rollers
@@ -493,10 +578,17 @@ document.addEventListener('DOMContentLoaded', () => {
             layoutWasMissing = true;
         }
 
+        // ladder/snake starts by tile number, from the server's board_features
+        const jumps = {};
+        const features = snapshot.board_features || {};
+        (features.ladders || []).forEach(([from, to]) => { jumps[from] = ['ladder', to]; });
+        (features.snakes || []).forEach(([from, to]) => { jumps[from] = ['snake', to]; });
+
         // Render board cells using boardLayout
         cells.forEach(c => {
             c.innerHTML = '';
-            c.classList.remove('occupied');
+            c.classList.remove('occupied', 'ladder', 'snake');
+            c.removeAttribute('title');
             const domRow = Number(c.dataset.row);
             const col = Number(c.dataset.col);
             // Convert domRow to logical y (since domRow 0 is top, logical y 9)
@@ -507,6 +599,13 @@ document.addEventListener('DOMContentLoaded', () => {
             c.style.backgroundImage = `url('${img}')`;
             c.style.backgroundSize = 'cover';
             c.style.backgroundPosition = 'center';
+            // snake numbering: even rows run left->right, odd rows right->left
+            const tile = y * 10 + (y % 2 === 0 ? x : 9 - x);
+            const jump = jumps[tile];
+            if (jump) {
+                c.classList.add(jump[0]);
+                c.title = `${jump[0] === 'ladder' ? 'Ladder' : 'Snake'} to tile ${jump[1]}`;
+            }
         });
 
         const players = snapshot.players || {};
@@ -779,7 +878,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // add highlight style
     const extraStyle = document.createElement('style');
-    extraStyle.textContent = `.cell.highlight{outline:3px solid rgba(255,200,30,0.9);box-shadow:0 0 6px rgba(255,200,30,0.6) inset}`;
+    extraStyle.textContent = `.cell.highlight{outline:3px solid rgba(255,200,30,0.9);box-shadow:0 0 6px rgba(255,200,30,0.6) inset}
+.cell.ladder{box-shadow:0 0 0 3px rgba(60,180,75,0.85) inset}
+.cell.snake{box-shadow:0 0 0 3px rgba(200,40,40,0.85) inset}`;
     document.head.appendChild(extraStyle);
 
 });
@@ -0,0 +1,57 @@
+# timers.py
+# Deadlines for every match on the server in one min-heap, served by a single background task.
+# Rescheduling a key doesn't touch the heap entry it replaces: each key remembers its current
+# token and stale entries are dropped when they reach the top.
+import heapq, itertools, time
+from threading import Lock
+
+
+class TimerHeap:
+    def __init__(self):
+        # (deadline, token, key, payload), earliest deadline first
+        self.heap = []
+        # key -> token of its live entry; anything else in the heap for that key is stale
+        self.tokens = {}
+        self._counter = itertools.count()
+        self.lock = Lock()
+
+    def schedule(self, key, delay: float, payload=None) -> int:
+        """(Re)arm key to fire delay seconds from now, replacing any earlier deadline for it."""
+        with self.lock:
+            token = next(self._counter)
+            self.tokens[key] = token
+            heapq.heappush(self.heap, (time.monotonic() + delay, token, key, payload))
+            return token
+
+    def cancel(self, key):
+        with self.lock:
+            self.tokens.pop(key, None)
+
+    def pending(self, key) -> bool:
+        with self.lock:
+            return key in self.tokens
+
+    def _drop_stale(self):
+        while self.heap and self.tokens.get(self.heap[0][2]) != self.heap[0][1]:
+            heapq.heappop(self.heap)
+
+    def next_deadline(self):
+        """Seconds until the earliest live deadline, or None when nothing is armed."""
+        with self.lock:
+            self._drop_stale()
+            if not self.heap:
+                return None
+            return max(0.0, self.heap[0][0] - time.monotonic())
+
+    def pop_due(self):
+        """Remove and return (key, payload) of every live timer whose deadline has passed."""
+        now = time.monotonic()
+        due = []
+        with self.lock:
+            while True:
+                self._drop_stale()
+                if not self.heap or self.heap[0][0] > now:
+                    return due
+                _, _, key, payload = heapq.heappop(self.heap)
+                del self.tokens[key]
+                due.append((key, payload))